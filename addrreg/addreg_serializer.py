@@ -1,3 +1,5 @@
+import functools
+
 from django.core.serializers import python
 from django.utils.encoding import is_protected_type
 
@@ -21,3 +23,86 @@ class Serializer(python.Serializer):
 
 def Deserializer(*args, **kwargs):
     python.Deserializer(*args, **kwargs)
+
+
+def compile_fields(model):
+    '''Return a function extracting the fields of an instance of the
+    given model as :py:class:`Serializer` would, but without the
+    overhead of the serializer framework.
+
+    Foreign keys to temporal models refer to their target by its
+    ``objectID``, which is all their natural key consists of, so the
+    target is never loaded.
+
+    '''
+    opts = model._meta.concrete_model._meta
+
+    assert not [field for field in opts.many_to_many if field.serialize], (
+        'model {} has many-to-many fields, which we do not handle'
+    ).format(model)
+
+    extractors = []
+
+    for field in opts.local_fields:
+        if not field.serialize:
+            continue
+
+        remote = field.remote_field and field.remote_field.model
+
+        if remote is None or not hasattr(remote, 'natural_key'):
+            extractor = functools.partial(_get_value, field)
+
+        elif remote is getattr(model, 'modelclass', None):
+            # a registration refers to its own object
+            extractor = functools.partial(_get_own_key, field)
+
+        elif (hasattr(remote, 'natural_key_for') and
+              field.target_field.name == 'objectID'):
+            extractor = functools.partial(_get_temporal_key, field)
+
+        else:
+            extractor = functools.partial(_get_natural_key, field)
+
+        extractors.append((field.name, extractor))
+
+    def get_fields(obj, exclude=()):
+        return {
+            name: extractor(obj)
+            for name, extractor in extractors
+            if name not in exclude
+        }
+
+    return get_fields
+
+
+def _get_value(field, obj):
+    value = getattr(obj, field.get_attname())
+
+    if is_protected_type(value):
+        return value
+    else:
+        return field.value_to_string(obj)
+
+
+def _get_own_key(field, obj):
+    if getattr(obj, field.get_attname()) is None:
+        return None
+
+    return field.remote_field.model.natural_key_for(obj.objectID)
+
+
+def _get_temporal_key(field, obj):
+    value = getattr(obj, field.get_attname())
+
+    if value is None:
+        return None
+
+    return field.remote_field.model.natural_key_for(
+        field.target_field.to_python(value),
+    )
+
+
+def _get_natural_key(field, obj):
+    related = getattr(obj, field.name)
+
+    return related.natural_key() if related else None
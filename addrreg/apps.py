@@ -12,3 +12,7 @@ class AddrRegConfig(AppConfig):
         'https://redmine.magenta-aps.dk'
         '/projects/dafodoc/wiki/2_Adresseopslagsregistret'
     )
+
+    def ready(self):
+        # connect the signal receivers
+        from . import connections  # noqa
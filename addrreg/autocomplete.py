@@ -0,0 +1,174 @@
+# -*- mode: python; coding: utf-8 -*-
+
+'''In-memory autocompletion of the objects referred to in the admin.
+
+Each process keeps an index of the active objects of each model below,
+mapping the normalised words of their names to their IDs, grouped by
+municipality. Suggestions are then looked up in the index of the
+municipalities a user may edit without querying the objects themselves,
+although each keystroke takes one indexed query for the latest event of
+the models the index depends on.
+
+An index is discarded whenever an object it covers is saved in this
+process, and rebuilt once events for the models it depends on were
+created since it was built, which covers saves in other processes as
+well. As transactions may commit out of order, indexes are also rebuilt
+once they reach ``MAX_AGE``. Deletions in other processes remain
+suggested until then, but they can no longer be chosen anyway.
+
+'''
+
+import bisect
+import collections
+import functools
+import threading
+import time
+
+from django.db import models
+from django.db.models import signals
+
+from .models import data, signals as addrreg_signals
+from .models.events import Event
+from .models.search import tokenise
+
+# the fields indexed for each model, and the models they depend on
+INDEXED_FIELDS = {
+    data.BNumber: ('code', 'b_type', 'b_callname', 'location__name'),
+    data.Road: ('code', 'name', 'shortname', 'alternate_name', 'cpr_name'),
+    data.Locality: ('code', 'abbrev', 'name'),
+}
+
+DEPENDENCIES = {
+    data.BNumber: (data.BNumber, data.Locality),
+    data.Road: (data.Road,),
+    data.Locality: (data.Locality,),
+}
+
+# seconds before rebuilding an index regardless
+MAX_AGE = 300
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _get_value(obj, path):
+    for name in path.split('__'):
+        if obj is None:
+            break
+
+        obj = getattr(obj, name)
+
+    return '' if obj is None else str(obj)
+
+
+class Index(object):
+    '''Prefix index of the active objects of a model, by municipality.'''
+
+    def __init__(self, model, version=None):
+        self.model = model
+        self.version = version
+        self.created = time.monotonic()
+
+        fields = INDEXED_FIELDS[model]
+        related = {
+            field.rsplit('__', 1)[0] for field in fields if '__' in field
+        }
+
+        self.labels = {}
+        self.terms = collections.defaultdict(list)
+
+        for obj in model.objects.filter(active=True).select_related(
+            *sorted(related)
+        ).iterator():
+            self.labels[obj.pk] = str(obj)
+
+            words = {
+                word
+                for field in fields
+                for word in tokenise(_get_value(obj, field))
+            }
+
+            self.terms[obj.municipality_id].extend(
+                (word, obj.pk) for word in words
+            )
+
+        for terms in self.terms.values():
+            terms.sort()
+
+    def _find(self, token, municipality_ids):
+        found = set()
+
+        for municipality_id in municipality_ids:
+            terms = self.terms.get(municipality_id, [])
+            i = bisect.bisect_left(terms, (token,))
+
+            while i < len(terms) and terms[i][0].startswith(token):
+                found.add(terms[i][1])
+                i += 1
+
+        return found
+
+    def suggest(self, query, municipality_ids=None, limit=None):
+        '''Return the labels and IDs of the objects with a word starting
+        with each word of the query, ordered by label.
+
+        Only objects of the given municipalities are considered, unless
+        ``municipality_ids`` is ``None``.
+
+        '''
+        if municipality_ids is None:
+            municipality_ids = list(self.terms)
+
+        tokens = tokenise(query)
+
+        if not tokens:
+            return []
+
+        matches = functools.reduce(
+            set.intersection,
+            (self._find(token, municipality_ids) for token in tokens),
+        )
+
+        return sorted((self.labels[pk], pk) for pk in matches)[:limit]
+
+
+def get_version(model):
+    '''Return the sequence number of the latest event for any of the
+    models the index of the given model depends on.'''
+    return Event.objects.filter(
+        updated_type__in=[
+            dependency.type_name() for dependency in DEPENDENCIES[model]
+        ],
+    ).aggregate(models.Max('sequence'))['sequence__max']
+
+
+def get_index(model):
+    '''Return an up-to-date index of the given model.'''
+    version = get_version(model)
+
+    def is_current(index):
+        return (index is not None and index.version == version and
+                time.monotonic() - index.created < MAX_AGE)
+
+    index = _indexes.get(model)
+
+    if not is_current(index):
+        with _lock:
+            index = _indexes.get(model)
+
+            if not is_current(index):
+                index = _indexes[model] = Index(model, version)
+
+    return index
+
+
+def _discard(sender, model, **kwargs):
+    _indexes.pop(model, None)
+
+
+for model, dependencies in DEPENDENCIES.items():
+    for dependency in dependencies:
+        for signal in (signals.post_save, signals.post_delete,
+                       addrreg_signals.post_bulk_save):
+            signal.connect(functools.partial(_discard, model=model),
+                           sender=dependency, weak=False)
@@ -0,0 +1,36 @@
+# -*- mode: python; coding: utf-8 -*-
+
+'''Calculation of registration checksums in worker processes.
+
+Workers started by spawning rather than forking, as on Windows, import
+this module before Django is set up, so it must not import the models
+until a worker has set it up. The management commands are no place for
+these functions, as importing any of them imports them all.
+
+'''
+
+import django
+from django import db
+
+
+def init_worker():
+    # connections inherited from the parent process are unusable
+    db.connections.close_all()
+    django.setup()
+
+
+def calculate_checksums(task):
+    '''Return the type and the IDs and checksums of the given
+    registrations, without saving them.'''
+    from . import models
+
+    type_name, ids = task
+    regcls = models.ALL_OBJECT_CLASSES[type_name].Registrations
+
+    checksums = []
+
+    for registration in regcls.objects.filter(pk__in=ids):
+        registration.calculate_checksum(save=False)
+        checksums.append((registration.pk, registration.checksum))
+
+    return type_name, checksums
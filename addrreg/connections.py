@@ -0,0 +1,83 @@
+# -*- mode: python; coding: utf-8 -*-
+
+'''Persistent database connections.
+
+Django keeps the connection of each thread open across requests for up
+to ``CONN_MAX_AGE`` seconds, rather than connecting anew for each
+request. A connection kept open may break without notice, e.g. when
+the database server restarts, so connections configured with
+``CONN_HEALTH_CHECKS`` are checked at the start of a request and
+replaced if unusable, as later versions of Django do.
+
+As a check takes a round trip to the database, only connections idle
+for at least ``MAX_IDLE`` seconds are checked; a connection breaking
+while in use is closed by Django once the request finishes anyway.
+
+'''
+
+import time
+
+from django import db, dispatch
+from django.core import signals as core_signals
+from django.db.backends import signals as db_signals
+
+# seconds a connection may be idle before it is checked again
+MAX_IDLE = 30
+
+
+@dispatch.receiver(db_signals.connection_created)
+def _record_connection(sender, connection, **kwargs):
+    connection.connected_at = connection.used_at = time.monotonic()
+
+
+@dispatch.receiver(core_signals.request_finished)
+def _record_use(**kwargs):
+    now = time.monotonic()
+
+    for connection in db.connections.all():
+        if connection.connection is not None:
+            connection.used_at = now
+
+
+@dispatch.receiver(core_signals.request_started)
+def check_connections(**kwargs):
+    '''Close any persistent connection idle for a while and no longer
+    usable, so that the request opens a new one when needed.'''
+    now = time.monotonic()
+
+    for connection in db.connections.all():
+        if (connection.connection is None or
+                connection.in_atomic_block or
+                not connection.settings_dict.get('CONN_HEALTH_CHECKS') or
+                now - getattr(connection, 'used_at', 0) < MAX_IDLE):
+            continue
+
+        try:
+            usable = connection.is_usable()
+        except NotImplementedError:
+            continue
+
+        if not usable:
+            connection.close()
+
+
+def pool_state():
+    '''Return the state of the connections of this thread, by alias.'''
+    now = time.monotonic()
+
+    return {
+        connection.alias: {
+            'vendor': connection.vendor,
+            'connected': connection.connection is not None,
+            'age': (
+                now - connection.connected_at
+                if connection.connection is not None and
+                hasattr(connection, 'connected_at') else None
+            ),
+            'max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'health_checks': bool(
+                connection.settings_dict.get('CONN_HEALTH_CHECKS'),
+            ),
+        }
+        for connection in db.connections.all()
+    }
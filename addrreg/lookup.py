@@ -0,0 +1,148 @@
+# -*- mode: python; coding: utf-8 -*-
+
+'''Lookup of current addresses by their parts.
+
+Lookups are answered from the address resolution table, so that a
+single lookup is one indexed query. A batch of lookups fetches every
+candidate for the roads it mentions in a few queries, indexes them in
+memory and matches each lookup against that index.
+
+Either way, the database merely narrows down the candidates, which are
+then matched exactly here, so that both agree regardless of whether
+the collation of the database ignores case.
+
+'''
+
+import collections
+import itertools
+
+from django.db import models
+
+from .models.resolution import AddressResolution
+
+# the criteria of a lookup, along with the column each matches and
+# the type of its values
+CRITERIA = collections.OrderedDict([
+    ('road', ('road_name', str)),
+    ('house_number', ('house_number', str)),
+    ('floor', ('floor', str)),
+    ('room', ('room', str)),
+    ('b_number', ('b_number_code', str)),
+    ('locality', ('locality_name', str)),
+    ('postal_code', ('postal_code_code', int)),
+    ('municipality', ('municipality_name', str)),
+])
+
+FIELDS = (
+    'objectID',
+    'house_number',
+    'floor',
+    'room',
+    'road_code',
+    'road_name',
+    'b_number_code',
+    'b_callname',
+    'locality_code',
+    'locality_name',
+    'postal_code_code',
+    'postal_code_name',
+    'municipality_code',
+    'municipality_name',
+)
+
+
+def parse(criteria):
+    '''Convert the given criteria to a mapping of columns to values,
+    raising :py:exc:`ValueError` if any are unknown or invalid. A value
+    of ``None`` matches addresses lacking that part.'''
+    if not criteria:
+        raise ValueError('no criteria given')
+
+    columns = {}
+
+    for key, value in criteria.items():
+        try:
+            column, type_ = CRITERIA[key]
+        except KeyError:
+            raise ValueError('unknown criterion {!r}'.format(key))
+
+        try:
+            columns[column] = type_(value) if value is not None else None
+        except (TypeError, ValueError):
+            raise ValueError('invalid {} {!r}'.format(key, value))
+
+    return columns
+
+
+def _candidates():
+    return AddressResolution.objects.filter(
+        active=True,
+    ).order_by('pk').values(*FIELDS)
+
+
+def _matches(row, columns):
+    return all(row[column] == value for column, value in columns.items())
+
+
+def find(criteria, limit=100):
+    '''Return the current addresses matching the given criteria.'''
+    columns = parse(criteria)
+
+    return list(itertools.islice(
+        (
+            row for row in _candidates().filter(**columns).iterator()
+            if _matches(row, columns)
+        ),
+        limit,
+    ))
+
+
+def find_all(lookups, batch_size=500):
+    '''Return the current addresses matching each of the given criteria,
+    which must all include a road, in the same order.
+
+    This takes one query for every ``batch_size`` distinct roads, no
+    matter how many lookups there are.
+
+    '''
+    lookups = [parse(criteria) for criteria in lookups]
+
+    if not all('road_name' in columns for columns in lookups):
+        raise ValueError('each lookup must include a road')
+
+    road_names = sorted({
+        columns['road_name'] for columns in lookups
+        if columns['road_name'] is not None
+    })
+    conditions = [
+        models.Q(road_name__in=road_names[start:start + batch_size])
+        for start in range(0, len(road_names), batch_size)
+    ]
+
+    # ``IN`` never matches NULL, so look for addresses lacking a road
+    # separately, albeit in the same query
+    if any(columns['road_name'] is None for columns in lookups):
+        if conditions:
+            conditions[0] |= models.Q(road_name__isnull=True)
+        else:
+            conditions.append(models.Q(road_name__isnull=True))
+
+    by_road = collections.defaultdict(list)
+    by_number = collections.defaultdict(list)
+
+    for condition in conditions:
+        for row in _candidates().filter(condition).iterator():
+            by_road[row['road_name']].append(row)
+            by_number[row['road_name'], row['house_number']].append(row)
+
+    def match(columns):
+        if 'house_number' in columns:
+            rows = by_number.get(
+                (columns['road_name'], columns['house_number']), [],
+            )
+        else:
+            rows = by_road.get(columns['road_name'], [])
+
+        return [row for row in rows if _matches(row, columns)]
+
+    return [match(columns) for columns in lookups]
@@ -0,0 +1,79 @@
+import itertools
+import multiprocessing
+import os
+
+from django import db
+from django.core.management import base
+
+from ... import checksums as workers, models, util
+
+
+class Command(base.BaseCommand):
+    help = 'Calculate the checksums of registrations lacking one'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help=u"amount of worker processes calculating checksums"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help=u"amount of registrations in each task and update"
+        )
+
+    def get_tasks(self, chunk_size):
+        for type_name, cls in sorted(models.ALL_OBJECT_CLASSES.items()):
+            ids = cls.Registrations.objects.filter(
+                checksum=None,
+            ).order_by('pk').values_list('pk', flat=True).iterator()
+
+            while True:
+                chunk = list(itertools.islice(ids, chunk_size))
+
+                if not chunk:
+                    break
+
+                yield type_name, chunk
+
+    def handle(self, processes, chunk_size, verbosity, **kwargs):
+        # gather everything up front, so that we don't read and write
+        # the same table at once
+        tasks = list(self.get_tasks(chunk_size))
+
+        if not tasks:
+            self.stdout.write('All registrations have checksums.')
+            return
+
+        if processes > 1:
+            db.connections.close_all()
+            pool = multiprocessing.Pool(processes,
+                                        initializer=workers.init_worker)
+            results = pool.imap_unordered(workers.calculate_checksums,
+                                          tasks)
+        else:
+            pool = None
+            results = map(workers.calculate_checksums, tasks)
+
+        count = 0
+
+        try:
+            for type_name, checksums in results:
+                regcls = models.ALL_OBJECT_CLASSES[type_name].Registrations
+
+                util.bulk_update(regcls.objects.all(), [
+                    regcls.from_db(None, ['id', 'checksum'], values)
+                    for values in checksums
+                ], ['checksum'])
+
+                count += len(checksums)
+
+                if verbosity > 1:
+                    self.stdout.write('{}: {} checksums'.format(
+                        type_name, len(checksums),
+                    ))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.stdout.write('Calculated {} checksums.'.format(count))
@@ -0,0 +1,332 @@
+import collections
+import datetime
+import functools
+import itertools
+import json
+import random
+import time
+import uuid
+
+from django import db
+from django.core.handlers import wsgi
+from django.core.management import base
+from django.db import models as db_models, transaction
+from django.test import client, utils
+from django.utils import timezone
+
+from ... import models, views
+from ...models import base as models_base
+
+SCENARIOS = collections.OrderedDict()
+
+
+def scenario(func=None, rollback=True):
+    '''Register a benchmark scenario; each is called with the options
+    of the command, and yields a label, an amount of iterations and the
+    :py:class:`Measurement` of them.
+
+    Scenarios run in a transaction that is rolled back afterwards,
+    unless ``rollback`` is unset, as for those that reconnect.
+
+    '''
+    if func is None:
+        return functools.partial(scenario, rollback=rollback)
+
+    func.rollback = rollback
+    SCENARIOS[func.__name__.replace('_', '-')] = func
+    return func
+
+
+class Measurement(object):
+    '''Context manager recording the elapsed time and the amount of
+    queries issued within it.'''
+
+    def __init__(self, using='default'):
+        self.queries = utils.CaptureQueriesContext(db.connections[using])
+        self.elapsed = None
+
+    def __enter__(self):
+        self.queries.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
+        self.queries.__exit__(*exc_info)
+
+    def __len__(self):
+        return len(self.queries)
+
+
+@scenario
+def construct(count, **options):
+    '''Instantiate each model without a state, as the importer and the
+    blank add forms of the admin do.'''
+    models_base._clear_state_ids()
+
+    for cls in models.ALL_OBJECT_CLASSES.values():
+        with Measurement() as measurement:
+            for i in range(count):
+                cls()
+
+        yield cls.type_name(), count, measurement
+
+
+def _seed_registrations(regcls, count, versions, start,
+                        get_fields=lambda i: {}):
+    '''Insert ``versions`` consecutive registrations, one day apart,
+    of ``count`` objects straight into the registration table of a model
+    and return their object IDs.'''
+    object_ids = [uuid.uuid4() for i in range(count)]
+
+    def generate():
+        for i, object_id in enumerate(object_ids):
+            fields = get_fields(i)
+
+            for version in range(versions):
+                yield regcls(
+                    objectID=object_id,
+                    registration_from=start + datetime.timedelta(version),
+                    registration_to=(
+                        start + datetime.timedelta(version + 1)
+                        if version < versions - 1 else None
+                    ),
+                    code=i,
+                    name='{} {}'.format(i, version),
+                    sumiffiik_domain='https://data.gl',
+                    **fields
+                )
+
+    registrations = generate()
+
+    while True:
+        batch = list(itertools.islice(registrations, 10000))
+
+        if not batch:
+            return object_ids
+
+        regcls.objects.bulk_create(batch)
+
+
+@scenario
+def as_of(count, versions, **options):
+    '''Query the roads as of a point in time, resolving their
+    municipality and locality, after seeding ``count`` roads with
+    ``versions`` registrations each.'''
+    start = timezone.now() - datetime.timedelta(versions + 1)
+    rng = random.Random(0)
+
+    # registrations do not constrain their references
+    state_id = uuid.uuid4()
+    municipality_ids = _seed_registrations(
+        models.Municipality.Registrations, 100, versions, start,
+        lambda i: {'state_id': state_id, 'abbrev': 'M'},
+    )
+    locality_ids = _seed_registrations(
+        models.Locality.Registrations, 100, versions, start,
+        lambda i: {'state_id': state_id},
+    )
+    road_ids = _seed_registrations(
+        models.Road.Registrations, count, versions, start,
+        lambda i: {
+            'state_id': state_id,
+            'municipality_id': municipality_ids[i % 100],
+            'location_id': locality_ids[i % 100],
+        },
+    )
+    timestamps = [
+        start + datetime.timedelta(versions * (i + 0.5) / 5)
+        for i in range(5)
+    ]
+
+    with Measurement() as measurement:
+        for timestamp in timestamps:
+            list(models.Road.objects.as_of(timestamp).resolve(
+                'municipality', 'location',
+            ))
+
+    yield 'scan of {} roads'.format(count), len(timestamps), measurement
+
+    lookups = [
+        (rng.choice(road_ids),
+         start + datetime.timedelta(rng.uniform(0, versions)))
+        for i in range(min(count, 1000))
+    ]
+
+    with Measurement() as measurement:
+        for object_id, timestamp in lookups:
+            models.Road.objects.as_of(timestamp).get(objectID=object_id)
+
+    yield 'lookup', len(lookups), measurement
+
+
+def _seed_addresses(count, road_names):
+    '''Save ``count`` addresses spread over roads with the given names,
+    along with everything they refer to. As for any save, this resolves
+    the addresses.'''
+    aggregates = models.State.objects.aggregate(
+        db_models.Max('pk'), db_models.Max('code'),
+    )
+    pk = (aggregates['pk__max'] or 0) + 1
+    state = models.State.objects.create(
+        id=pk,
+        state_id=pk,
+        name='Benchmark {}'.format(pk),
+        code=(aggregates['code__max'] or 0) + 1,
+    )
+
+    common = {'state': state, 'sumiffiik_domain': 'https://data.gl'}
+    municipality = models.Municipality.objects.create(
+        name='Benchmark', code=0, **common
+    )
+    locality = models.Locality.objects.create(
+        name='Nuuk', code=0, municipality=municipality, **common
+    )
+    b_number = models.BNumber.objects.create(
+        code='B-0', location=locality, municipality=municipality, **common
+    )
+    roads = models.Road.objects.bulk_save(
+        models.Road(name=name, code=i, location=locality,
+                    municipality=municipality, **common)
+        for i, name in enumerate(road_names)
+    )
+
+    models.Address.objects.bulk_save(
+        models.Address(
+            house_number=str(i // len(roads)),
+            road=roads[i % len(roads)],
+            b_number=b_number,
+            municipality=municipality,
+            **common
+        )
+        for i in range(count)
+    )
+
+
+@scenario
+def lookup(count, **options):
+    '''Look up addresses through the lookup API, one at a time and in
+    batches of a thousand, after seeding ``count`` addresses spread
+    over a hundred roads.'''
+    rng = random.Random(0)
+    roads = ['Vej {}'.format(i) for i in range(100)]
+
+    _seed_addresses(count, roads)
+
+    def generate_lookup():
+        return {
+            'road': rng.choice(roads),
+            'house_number': str(rng.randrange(count // 100 + 1)),
+        }
+
+    view = views.LookupView.as_view()
+    factory = client.RequestFactory()
+
+    requests = [
+        factory.get('/lookup/address', generate_lookup())
+        for i in range(min(count, 1000))
+    ]
+
+    with Measurement() as measurement:
+        for request in requests:
+            view(request)
+
+    yield 'get requests', len(requests), measurement
+
+    requests = [
+        factory.post(
+            '/lookup/address',
+            json.dumps({
+                'addresses': [generate_lookup() for j in range(1000)],
+            }),
+            content_type='application/json',
+        )
+        for i in range(10)
+    ]
+
+    with Measurement() as measurement:
+        for request in requests:
+            view(request)
+
+    yield 'batch requests of 1000', len(requests), measurement
+
+
+@scenario(rollback=False)
+def connections(count, **options):
+    '''Request the database monitor and the admin login page through
+    the WSGI handler, first connecting to the database for each request
+    and then keeping a persistent connection.'''
+    handler = wsgi.WSGIHandler()
+    factory = client.RequestFactory()
+    connection = db.connection
+    max_age = connection.settings_dict['CONN_MAX_AGE']
+
+    def start_response(status, headers):
+        pass
+
+    try:
+        for mode, conn_max_age in [('connecting', 0), ('persistent', None)]:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+
+            for path in ['/monitor/database', '/admin/login/']:
+                environ = factory.get(path).environ
+
+                with Measurement() as measurement:
+                    for i in range(count):
+                        handler(environ, start_response).close()
+
+                yield '{} {}'.format(mode, path), count, measurement
+
+    finally:
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+
+
+class Command(base.BaseCommand):
+    help = 'Measure the time and queries taken by common operations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*', metavar='scenario',
+            help=u"scenarios to run, out of {}; defaults to all".format(
+                ', '.join(SCENARIOS),
+            ),
+        )
+        parser.add_argument(
+            '--count', type=int, default=1000,
+            help=u"amount of iterations or objects in each scenario",
+        )
+        parser.add_argument(
+            '--versions', type=int, default=10,
+            help=u"amount of registrations of each object, where "
+            u"applicable; a --count of 100000 with the default "
+            u"seeds a million registrations",
+        )
+
+    def handle(self, scenarios, count, versions, **kwargs):
+        for name in scenarios:
+            if name not in SCENARIOS:
+                raise base.CommandError('unknown scenario {!r}'.format(name))
+
+        for name in scenarios or SCENARIOS:
+            if SCENARIOS[name].rollback:
+                # scenarios may write, so discard whatever they did
+                with transaction.atomic():
+                    self.run_scenario(name, count=count, versions=versions)
+
+                    transaction.set_rollback(True)
+            else:
+                self.run_scenario(name, count=count, versions=versions)
+
+    def run_scenario(self, name, **options):
+        for label, iterations, measurement in SCENARIOS[name](**options):
+            self.stdout.write(
+                '{} {}: {} iterations in {:.3f}s ({:.1f}us each), '
+                '{} queries ({:.3f} each)'.format(
+                    name, label, iterations, measurement.elapsed,
+                    1e6 * measurement.elapsed / iterations,
+                    len(measurement),
+                    len(measurement) / iterations,
+                )
+            )
@@ -1,6 +1,7 @@
 import concurrent.futures
 import itertools
 import json
+import time
 import traceback
 
 import progress.bar
@@ -8,6 +9,7 @@ import openpyxl
 
 from django import db
 from django.core import exceptions
+from django.db import transaction
 from django.core.management import base
 
 from ... import models
@@ -146,7 +148,7 @@ VALUE_MAPS = {
 
 
 def import_spreadsheet(fp, verbose=False, raise_on_error=False,
-                       interactive=True, parallel=1):
+                       interactive=True, parallel=1, chunk_size=1000):
     object_count = sum(
         v[None].objects.count()
         for v in SPREADSHEET_MAPPINGS.values()
@@ -181,7 +183,7 @@ Are you sure you want to do this?
     try:
         for sheet in wb:
             try:
-                mapping = SPREADSHEET_MAPPINGS[sheet.title]
+                mapping = dict(SPREADSHEET_MAPPINGS[sheet.title])
             except KeyError:
                 continue
 
@@ -194,9 +196,18 @@ Are you sure you want to do this?
                 for col in next(rows)
             ]
 
-            def save(row):
+            def fail(msg):
+                if raise_on_error:
+                    raise base.CommandError(msg)
+                elif verbose:
+                    print(msg)
+                    traceback.print_exc()
+                else:
+                    print(msg)
+
+            def convert(row):
                 if row[0].value in DROP:
-                    return
+                    return None
 
                 try:
                     kws = {
@@ -209,53 +220,103 @@ Are you sure you want to do this?
                         if column_names[cellidx]
                     }
                 except KeyError:
-                    msg = 'error mapping {} {}: {}'.format(
-                        sheet.title, kws['id'], json.dumps({
+                    fail('error mapping {} {}: {}'.format(
+                        sheet.title, row[0].value, json.dumps({
                             column_names[cellidx]: cell.value
                             for cellidx, cell in enumerate(row)
                             if column_names[cellidx]
-                        }, indent=2)
-                    )
+                        }, indent=2, default=str)
+                    ))
 
-                    if raise_on_error:
-                        raise base.CommandError(msg)
-                    else:
-                        print(msg)
+                    return None
 
                 try:
                     kws.update(OVERRIDES[kws['id']])
                 except KeyError:
                     pass
 
+                return kws
+
+            def save(row):
+                kws = convert(row)
+
+                if kws is None:
+                    return
+
                 try:
                     cls.objects.create(**kws)
                 except (db.Error, exceptions.ValidationError,
                         exceptions.ObjectDoesNotExist) as exc:
-                    msg = 'error processing {} {}: {}'.format(
+                    fail('error processing {} {}: {}'.format(
                         sheet.title, kws['id'], json.dumps(kws, indent=2),
-                    )
+                    ))
 
-                    if raise_on_error:
-                        raise base.CommandError(msg)
-                    elif verbose:
-                        print(msg)
-                        traceback.print_exc()
+            def save_chunk(chunk):
+                # the entire chunk goes into one transaction; should
+                # that fail, we retry each row on its own, so that we
+                # can report the bad ones, and still import the rest
+                try:
+                    with transaction.atomic():
+                        cls.objects.bulk_save(
+                            [cls(**kws) for kws in chunk],
+                            batch_size=len(chunk),
+                        )
+                except (db.Error, exceptions.ValidationError,
+                        exceptions.ObjectDoesNotExist):
+                    if len(chunk) > 1:
+                        for kws in chunk:
+                            save_chunk([kws])
                     else:
-                        print(msg)
+                        fail('error processing {} {}: {}'.format(
+                            sheet.title, chunk[0]['id'],
+                            json.dumps(chunk[0], indent=2, default=str),
+                        ))
+
+            def import_rows(rows):
+                rows = iter(rows)
+
+                if not chunk_size:
+                    # executing two saves concurrently ensures that
+                    # we'll typically be preparing the next while
+                    # waiting for the current one to save in the
+                    # database
+                    with concurrent.futures.ThreadPoolExecutor(
+                            parallel) as e:
+                        for f in e.map(save, rows):
+                            bar.next()
+
+                    return
+
+                while True:
+                    chunk = list(itertools.islice(rows, chunk_size))
+
+                    if not chunk:
+                        break
+
+                    kwss = [kws for kws in map(convert, chunk) if kws]
+
+                    if kwss:
+                        save_chunk(kwss)
+
+                    bar.next(len(chunk))
+
+            start = time.monotonic()
+            counter = itertools.count()
+            rows = (row for row, i in zip(rows, counter))
 
             if sheet.title == 'state':
                 # HACK: work around the fact that the first state refers
                 # to the second state, by importing them in reverse order
-                for row in reversed(list(itertools.islice(rows, 2))):
-                    save(row)
-                    bar.next()
-
-            # executing two saves concurrently ensures that we'll
-            # typically be preparing the next while waiting for the
-            # current one to save in the database
-            with concurrent.futures.ThreadPoolExecutor(parallel) as e:
-                for f in e.map(save, rows):
-                    bar.next()
+                import_rows(reversed(list(itertools.islice(rows, 2))))
+
+            import_rows(rows)
+
+            count = next(counter)
+            duration = time.monotonic() - start
+
+            print('\nimported {} rows of {} in {:.1f}s ({:.0f} rows/s)'
+                  .format(count, sheet.title, duration,
+                          count / duration if duration else 0))
     finally:
         bar.finish()
 
@@ -274,7 +335,13 @@ class Command(base.BaseCommand):
         parser.add_argument(
             '--parallel', type=int,
             default=1 if db.connection.vendor == 'sqlite' else 4,
-            help=u"amount of requests to perform in parallel"
+            help=u"amount of requests to perform in parallel, when "
+            u"importing row by row"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help=u"amount of rows to import in each transaction, or 0 "
+            u"to import row by row"
         )
         parser.add_argument('path', type=str, nargs='?',
                             default='fixtures/'
@@ -289,4 +356,5 @@ class Command(base.BaseCommand):
                 raise_on_error=kwargs['failfast'],
                 interactive=kwargs['interactive'],
                 parallel=kwargs['parallel'],
+                chunk_size=kwargs['chunk_size'],
             )
@@ -1,11 +1,10 @@
-import operator
-import traceback
+import concurrent.futures
+import itertools
 
 from ...models import *
 from ...models.events import *
+from ... import push
 
-from jsonview.decorators import _dump_json as dump_json
-import requests
 import progress.bar
 
 from django.conf import settings
@@ -37,7 +36,12 @@ class Command(base.BaseCommand):
         )
         parser.add_argument(
             '--parallel', type=int, default=1,
-            help=u"amount of requests to perform in parallel"
+            help=u"amount of requests to perform in parallel; events "
+            u"of each object are always pushed in order"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help=u"amount of events to fetch at a time"
         )
         parser.add_argument(
             '-I', '--include', action='append',
@@ -50,8 +54,8 @@ class Command(base.BaseCommand):
             help=u"exclude the given types"
         )
 
-    def handle(self, host, path, full, parallel, include, exclude, failfast,
-               verbosity, **kwargs):
+    def handle(self, host, path, full, parallel, batch_size, include,
+               exclude, failfast, verbosity, **kwargs):
         if '://' not in host:
             host = 'https://' + host
             print('Protocol not detected, prepending "https://"')
@@ -67,62 +71,71 @@ class Command(base.BaseCommand):
             and (not exclude or cls.type_name() not in exclude)
         }
 
-        session = requests.Session()
-
-        if parallel > 1:
-            import grequests
-
-            def post_message(message):
-                return grequests.post(
-                    endpoint,
-                    proxies=settings.PROXIES,
-                    data=dump_json(message),
-                    session=session,
-                    verify=False,
-                    headers={'Content-Type': 'application/json'},
-                    timeout=10,
-                )
-        else:
-            def post_message(message):
-                return session.post(
-                    endpoint,
-                    proxies=settings.PROXIES,
-                    data=dump_json(message),
-                    headers={'Content-Type': 'application/json'},
-                )
-
-        def fail(r, exc):
-            raise exc
-
         events = Event.objects.filter(
             updated_type__in=type_map.keys()
-        )
+        ).order_by('created', 'pk')
 
         if not full:
             events = events.filter(
                 receipt_obtained__isnull=True,
             )
 
-        if not events:
+        if not events.exists():
             print('Nothing new.')
             return
 
+        pusher = push.Pusher(endpoint, workers=parallel,
+                             batch_size=batch_size)
+
+        # only deliveries to the configured receiver count as such in
+        # the outbox; any other destination is merely a copy
+        record = endpoint == settings.PUSH_URL
+        event_iter = events.iterator()
+
+        # the objects with a failed event, whose later events are
+        # skipped so that they never arrive out of order
+        failed = set()
+        skipped = 0
+
         with progress.bar.Bar(max=events.count(),
                               suffix='%(index).0f of %(max).0f - '
-                              '%(elapsed_td)s / %(eta_td)s') as bar:
-            if parallel > 1:
-                request_iter = grequests.imap(
-                    map(post_message,
-                        map(operator.methodcaller('format'), events)),
-                    size=parallel,
-                    exception_handler=fail,
-                )
-            else:
-                request_iter = map(post_message,
-                                   map(operator.methodcaller('format'),
-                                       events))
-
-            for r in request_iter:
-                bar.next()
+                              '%(elapsed_td)s / %(eta_td)s') as bar, \
+                concurrent.futures.ThreadPoolExecutor(parallel) as executor:
+            while True:
+                # each batch completes before the next one starts, so
+                # ordering is preserved across batches as well, provided
+                # that events following a failure are skipped
+                batch = list(itertools.islice(event_iter, batch_size))
+
+                if not batch:
+                    break
+
+                results = pusher.push_events([
+                    event for event in batch
+                    if (event.objectID or event.pk) not in failed
+                ], executor)
+
+                if record:
+                    pusher.record(results)
+
+                skipped += len(batch) - len(results)
+
+                for result in results:
+                    if not result.ok:
+                        failed.add(result.event.objectID or result.event.pk)
+
+                bar.next(len(batch))
+
                 if failfast:
-                    r.raise_for_status()
+                    for result in results:
+                        if not result.ok:
+                            raise base.CommandError(
+                                'push of event {} failed: {}'.format(
+                                    result.event.eventID, result.error,
+                                )
+                            )
+
+        print(pusher.statistics.summary())
+
+        if skipped:
+            print('Skipped {} events following a failure.'.format(skipped))
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management import base
+
+from ... import push
+
+
+class Command(base.BaseCommand):
+    help = 'Continuously push pending events to the Datafordeler'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default=settings.PUSH_URL,
+            help=u"Destination to push to, defaults to PUSH_URL",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help=u"amount of requests to perform in parallel",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help=u"amount of events to fetch at a time",
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=10,
+            help=u"seconds to wait for each request",
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=5,
+            help=u"seconds to wait when no events are pending",
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help=u"exit once no events can be pushed",
+        )
+
+    def handle(self, url, workers, batch_size, timeout, poll_interval, once,
+               **kwargs):
+        if not url:
+            raise base.CommandError('no destination; set PUSH_URL or --url')
+
+        pusher = push.Pusher(url, workers=workers, batch_size=batch_size,
+                             timeout=timeout)
+
+        try:
+            count = pusher.run(once=once, poll_interval=poll_interval)
+        except KeyboardInterrupt:
+            return
+
+        self.stdout.write('Attempted {} events.'.format(count))
@@ -0,0 +1,27 @@
+from django.core.management import base
+from django.db import transaction
+
+from ... import models
+from ...models.resolution import AddressResolution
+
+
+class Command(base.BaseCommand):
+    help = 'Rebuild the address resolution table from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help=u"amount of addresses to process at a time",
+        )
+
+    @transaction.atomic
+    def handle(self, batch_size, **kwargs):
+        AddressResolution.objects.all().delete()
+        AddressResolution.objects.refresh(
+            models.Address._base_manager.all(),
+            batch_size=batch_size,
+        )
+
+        self.stdout.write('Resolved {} addresses.'.format(
+            AddressResolution.objects.count(),
+        ))
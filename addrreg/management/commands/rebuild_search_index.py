@@ -0,0 +1,19 @@
+from django.core.management import base
+from django.db import transaction
+
+from ...models.search import INDEXED_FIELDS, SearchEntry
+
+
+class Command(base.BaseCommand):
+    help = 'Rebuild the search index of the admin from scratch'
+
+    @transaction.atomic
+    def handle(self, **kwargs):
+        SearchEntry.objects.all().delete()
+
+        for model in INDEXED_FIELDS:
+            SearchEntry.objects.refresh(model, model._base_manager.all())
+
+        self.stdout.write('Indexed {} terms.'.format(
+            SearchEntry.objects.count(),
+        ))
@@ -0,0 +1,32 @@
+from django.core.management import base
+
+from ... import models, snapshot
+
+
+class Command(base.BaseCommand):
+    help = 'Write snapshots of the current registrations of each type'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'types', nargs='*', metavar='type',
+            help=u"types to write, out of {}; defaults to all".format(
+                ', '.join(sorted(models.ALL_OBJECT_CLASSES)),
+            ),
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help=u"ignore the previous snapshots",
+        )
+
+    def handle(self, types, full, **kwargs):
+        for type_name in types:
+            if type_name not in models.ALL_OBJECT_CLASSES:
+                raise base.CommandError('unknown type {!r}'.format(type_name))
+
+        for type_name in types or sorted(models.ALL_OBJECT_CLASSES):
+            header, count = snapshot.write(type_name, full=full)
+
+            self.stdout.write('Wrote {} {} registrations, up to event {}, '
+                              'to {}'.format(count, type_name,
+                                             header['sequence'],
+                                             snapshot.get_path(type_name)))
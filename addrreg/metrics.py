@@ -0,0 +1,282 @@
+# -*- mode: python; coding: utf-8 -*-
+
+'''Metrics of the delivery of events, in the text format of Prometheus.
+
+The metrics are computed by one aggregate query over the events, read
+from an index covering every column it needs rather than the table.
+That query still scans the entire index, growing with the amount of
+events ever created, so its result is cached for ``CACHE_TIMEOUT``
+seconds in each process; each process thus makes at most one such
+scan in that time, however often it is scraped.
+
+The durations of the individual requests made by the push worker are
+only known to the worker itself, which reports them when it stops;
+here, the latency of a push is the time from the creation of an event
+until it was delivered.
+
+The histograms of the requests served by this process, as observed by
+the instrumentation middleware, follow the metrics of the events.
+
+'''
+
+import bisect
+import collections
+import datetime
+import threading
+import time
+
+from django.db import models
+
+from .models.events import Event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds to cache the metrics for
+CACHE_TIMEOUT = 5
+
+# upper bounds in seconds of the buckets of the latency histograms
+BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 6 * 3600, 24 * 3600)
+
+# the timestamp of each histogram, measured from the creation of events
+HISTOGRAMS = (
+    ('addrreg_event_receipt_lag_seconds', 'receipt_obtained',
+     'Time from the creation of an event until its receipt.'),
+    ('addrreg_event_push_latency_seconds', 'pushed',
+     'Time from the creation of an event until it was pushed.'),
+)
+
+_cache = None
+_lock = threading.Lock()
+
+
+class Histogram(object):
+    '''Distribution of the values observed in this process, by view.'''
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, view, value):
+        with self.lock:
+            counts, total = self.values.get(view, (None, 0))
+
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[view] = counts, total + value
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+
+        if not values:
+            return []
+
+        lines = [
+            '# HELP {} {}'.format(self.name, self.description),
+            '# TYPE {} histogram'.format(self.name),
+        ]
+
+        for view, (counts, total) in values:
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _format_labels(view=view, le=bound),
+                    cumulative,
+                ))
+
+            lines += [
+                '{}_sum{} {}'.format(
+                    self.name, _format_labels(view=view), total,
+                ),
+                '{}_count{} {}'.format(
+                    self.name, _format_labels(view=view), cumulative,
+                ),
+            ]
+
+        return lines
+
+
+# the histograms of each measurement of the requests
+REQUEST_HISTOGRAMS = collections.OrderedDict([
+    ('duration', Histogram(
+        'addrreg_request_duration_seconds',
+        'Time taken to respond to requests.',
+        (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )),
+    ('python', Histogram(
+        'addrreg_request_python_seconds',
+        'Time spent outside SQL queries when responding to requests.',
+        (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )),
+    ('sql', Histogram(
+        'addrreg_request_sql_seconds',
+        'Time spent in SQL queries when responding to requests.',
+        (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )),
+    ('queries', Histogram(
+        'addrreg_request_queries',
+        'SQL queries made when responding to requests.',
+        (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    )),
+    ('size', Histogram(
+        'addrreg_response_size_bytes',
+        'Size of the body of responses.',
+        (100, 1000, 10000, 100000, 1000000, 10000000),
+    )),
+])
+
+
+def _duration(field):
+    # SQLite cannot subtract missing timestamps, so skip them explicitly
+    return models.Case(
+        models.When(
+            then=models.F(field) - models.F('created'),
+            **{field + '__isnull': False}
+        ),
+        output_field=models.DurationField(),
+    )
+
+
+def _count(**kwargs):
+    return models.Count(models.Case(models.When(then=1, **kwargs)))
+
+
+def _seconds(value):
+    return value.total_seconds() if value is not None else 0
+
+
+def collect():
+    '''Return the aggregates of the events, by type.'''
+    aggregates = {
+        'pending': _count(receipt_obtained__isnull=True),
+        'receipted': _count(receipt_obtained__isnull=False,
+                            receipt_errorcode__isnull=True),
+        'failed': _count(receipt_obtained__isnull=False,
+                         receipt_errorcode__isnull=False),
+        'push_attempts': models.Sum('push_attempts'),
+    }
+
+    for name, field, description in HISTOGRAMS:
+        aggregates[name + '_count'] = _count(**{field + '__isnull': False})
+        aggregates[name + '_sum'] = models.Sum(_duration(field))
+
+        for i, bound in enumerate(BUCKETS):
+            aggregates['{}_{}'.format(name, i)] = _count(**{
+                field + '__lte':
+                models.F('created') + datetime.timedelta(seconds=bound),
+            })
+
+    return {
+        row.pop('updated_type'): row
+        for row in Event.objects.order_by().values(
+            'updated_type',
+        ).annotate(**aggregates)
+    }
+
+
+def _format_labels(**labels):
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'),
+        )
+        for key, value in sorted(labels.items())
+    ) + '}'
+
+
+def render(aggregates):
+    '''Format the given aggregates as Prometheus metrics.'''
+    types = sorted(aggregates)
+
+    lines = [
+        '# HELP addrreg_events Events by type and state of receipt.',
+        '# TYPE addrreg_events gauge',
+    ]
+
+    for type_name in types:
+        for state in ('pending', 'receipted', 'failed'):
+            lines.append('addrreg_events{} {}'.format(
+                _format_labels(type=type_name, state=state),
+                aggregates[type_name][state],
+            ))
+
+    lines += [
+        '# HELP addrreg_event_push_attempts_total Attempts to push events.',
+        '# TYPE addrreg_event_push_attempts_total counter',
+    ]
+
+    for type_name in types:
+        lines.append('addrreg_event_push_attempts_total{} {}'.format(
+            _format_labels(type=type_name),
+            aggregates[type_name]['push_attempts'] or 0,
+        ))
+
+    for name, field, description in HISTOGRAMS:
+        lines += [
+            '# HELP {} {}'.format(name, description),
+            '# TYPE {} histogram'.format(name),
+        ]
+
+        for type_name in types:
+            row = aggregates[type_name]
+
+            for i, bound in enumerate(BUCKETS):
+                lines.append('{}_bucket{} {}'.format(
+                    name, _format_labels(type=type_name, le=bound),
+                    row['{}_{}'.format(name, i)],
+                ))
+
+            lines += [
+                '{}_bucket{} {}'.format(
+                    name, _format_labels(type=type_name, le='+Inf'),
+                    row[name + '_count'],
+                ),
+                '{}_sum{} {}'.format(
+                    name, _format_labels(type=type_name),
+                    _seconds(row[name + '_sum']),
+                ),
+                '{}_count{} {}'.format(
+                    name, _format_labels(type=type_name),
+                    row[name + '_count'],
+                ),
+            ]
+
+    return '\n'.join(lines) + '\n'
+
+
+def get_metrics():
+    '''Return the current metrics, computing those of the events at
+    most once every ``CACHE_TIMEOUT`` seconds.'''
+    global _cache
+
+    def is_current(cache):
+        return (cache is not None and
+                time.monotonic() - cache[0] < CACHE_TIMEOUT)
+
+    cache = _cache
+
+    if not is_current(cache):
+        with _lock:
+            cache = _cache
+
+            if not is_current(cache):
+                cache = _cache = (time.monotonic(), render(collect()))
+
+    return cache[1] + ''.join(
+        line + '\n'
+        for histogram in REQUEST_HISTOGRAMS.values()
+        for line in histogram.render()
+    )
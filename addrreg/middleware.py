@@ -0,0 +1,211 @@
+# -*- mode: python; coding: utf-8 -*-
+
+'''Instrumentation of the requests served.
+
+When ``INSTRUMENTATION`` is set, each request records the amount of SQL
+queries made, the time spent in them and elsewhere, and the size of
+the response. These are aggregated by view into the histograms exposed
+at ``/monitor/metrics``, and requests slower than
+``INSTRUMENTATION_SLOW_REQUEST`` seconds are logged along with the
+queries they repeated most.
+
+Otherwise, the middleware removes itself when loaded, and costs
+nothing at all.
+
+'''
+
+import collections
+import logging
+import re
+import time
+
+from django import db
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# the amount of repeated queries to log for slow requests
+MAX_SHAPES = 5
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r'\(\?(?:, \?)+\)')
+
+
+def get_shape(sql):
+    '''Return the given SQL with its literal values replaced, so that
+    queries differing only in their parameters compare equal.'''
+    return _LISTS.sub('(...)', _LITERALS.sub('?', sql))
+
+
+class QueryLog(collections.deque):
+    '''The log of the queries of a connection, which also counts them
+    and sums their time, even once the oldest of them are discarded.'''
+
+    def __init__(self, iterable=(), maxlen=None):
+        super().__init__(iterable, maxlen)
+
+        self.count = len(self)
+        self.time = sum(float(query['time']) for query in self)
+
+    def append(self, query):
+        self.count += 1
+        self.time += float(query['time'])
+
+        super().append(query)
+
+
+class Measurement(object):
+    '''The queries made and the time taken from its creation until it
+    is stopped.'''
+
+    def __init__(self):
+        # record the queries as with DEBUG; Django empties the log as
+        # each request starts, and keeps at most 9000 queries in it, so
+        # count them separately
+        self.connections = db.connections.all()
+        self.debug_cursors = [c.force_debug_cursor for c in self.connections]
+
+        for connection in self.connections:
+            if not isinstance(connection.queries_log, QueryLog):
+                connection.queries_log = QueryLog(
+                    connection.queries_log, connection.queries_log.maxlen,
+                )
+
+            connection.force_debug_cursor = True
+
+        self.offsets = [
+            (c.queries_log.count, c.queries_log.time)
+            for c in self.connections
+        ]
+
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        self.count = 0
+        self.sql_time = 0
+        self.queries = []
+
+        for connection, debug_cursor, (count, sql_time) in zip(
+            self.connections, self.debug_cursors, self.offsets,
+        ):
+            connection.force_debug_cursor = debug_cursor
+
+            log = connection.queries_log
+            made = log.count - count
+
+            self.count += made
+            self.sql_time += log.time - sql_time
+
+            # merely the latest queries remain for the slow request log
+            if made:
+                self.queries += list(log)[-made:]
+
+
+class MeasuredStream(object):
+    '''Wrap the content of a streaming response, calling ``callback``
+    with its size once it is exhausted or closed, as the queries making
+    up such content happen while it is iterated.'''
+
+    def __init__(self, content, callback):
+        self.content = content
+        self.callback = callback
+        self.size = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.content:
+            self.size += len(chunk)
+            yield chunk
+
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+
+            if hasattr(self.content, 'close'):
+                self.content.close()
+
+            self.callback(self.size)
+
+
+class InstrumentationMiddleware(object):
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        measurement = Measurement()
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            measurement.stop()
+            raise
+
+        if response.streaming:
+            response.streaming_content = MeasuredStream(
+                response.streaming_content,
+                lambda size: self.record(request, measurement, size),
+            )
+        else:
+            self.record(request, measurement, len(response.content))
+
+        return response
+
+    def record(self, request, measurement, size):
+        measurement.stop()
+
+        measurements = {
+            'duration': measurement.duration,
+            'python': max(measurement.duration - measurement.sql_time, 0),
+            'sql': measurement.sql_time,
+            'queries': measurement.count,
+            'size': size,
+        }
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match else '<unresolved>'
+
+        for key, value in measurements.items():
+            metrics.REQUEST_HISTOGRAMS[key].observe(view, value)
+
+        if measurement.duration >= settings.INSTRUMENTATION_SLOW_REQUEST:
+            self.log_slow_request(request, view, measurements,
+                                  measurement.queries)
+
+    @staticmethod
+    def log_slow_request(request, view, measurements, queries):
+        shapes = collections.Counter()
+        times = collections.Counter()
+
+        for query in queries:
+            shape = get_shape(query['sql'])
+            shapes[shape] += 1
+            times[shape] += float(query['time'])
+
+        lines = [
+            'slow request to {} {} ({}): {:.0f}ms, {} queries in {:.0f}ms, '
+            '{} bytes'.format(
+                request.method, request.path, view,
+                1000 * measurements['duration'], measurements['queries'],
+                1000 * measurements['sql'], measurements['size'],
+            ),
+        ]
+
+        for shape, count in shapes.most_common(MAX_SHAPES):
+            if count < 2:
+                break
+
+            lines.append('  {} times in {:.0f}ms: {}'.format(
+                count, 1000 * times[shape], shape,
+            ))
+
+        logger.warning('\n'.join(lines))
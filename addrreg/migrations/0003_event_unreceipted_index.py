@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# backends supporting partial (or filtered) indexes
+PARTIAL_INDEX_VENDORS = {'postgresql', 'sqlite', 'microsoft'}
+
+
+def create_index(apps, schema_editor):
+    quote = schema_editor.quote_name
+
+    if schema_editor.connection.vendor in PARTIAL_INDEX_VENDORS:
+        sql = 'CREATE INDEX {0} ON {1} ({2}, {3}) WHERE {4} IS NULL'
+    else:
+        sql = 'CREATE INDEX {0} ON {1} ({4}, {2}, {3})'
+
+    schema_editor.execute(sql.format(
+        quote('addrreg_event_unreceipted'),
+        quote('addrreg_event'),
+        quote('created'),
+        quote('id'),
+        quote('receipt_obtained'),
+    ))
+
+
+def drop_index(apps, schema_editor):
+    quote = schema_editor.quote_name
+
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        sql = 'DROP INDEX {}'
+    else:
+        sql = 'DROP INDEX {} ON {}'
+
+    schema_editor.execute(sql.format(
+        quote('addrreg_event_unreceipted'),
+        quote('addrreg_event'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addrreg', '0002_unique_state_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def number_events(apps, schema_editor):
+    Event = apps.get_model('addrreg', 'Event')
+    EventSequence = apps.get_model('addrreg', 'EventSequence')
+    db_alias = schema_editor.connection.alias
+
+    # IDs are allocated in order of creation, which is as close to the
+    # order of commit as we can get for existing events
+    Event.objects.using(db_alias).update(sequence=models.F('id'))
+
+    EventSequence.objects.using(db_alias).create(
+        pk=1,
+        value=Event.objects.using(db_alias).aggregate(
+            models.Max('id'),
+        )['id__max'] or 0,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addrreg', '0004_event_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSequence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True,
+                                        serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='sequence',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(number_events, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='event',
+            name='sequence',
+            field=models.BigIntegerField(unique=True),
+        ),
+    ]
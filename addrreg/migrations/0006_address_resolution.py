@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 08:06
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def resolve_addresses(apps, schema_editor):
+    # like AddressResolution.from_address(), which historical models
+    # lack
+    Address = apps.get_model('addrreg', 'Address')
+    AddressResolution = apps.get_model('addrreg', 'AddressResolution')
+    db_alias = schema_editor.connection.alias
+
+    def resolve(address):
+        b_number = address.b_number
+        municipality = address.municipality
+        road = address.road
+        locality = road and road.location
+        postal_code = locality and locality.postal_code
+
+        return AddressResolution(
+            address=address,
+            objectID=address.objectID,
+            active=address.active,
+            house_number=address.house_number,
+            floor=address.floor,
+            room=address.room,
+            road=road,
+            road_code=road and road.code,
+            road_name=road and road.name,
+            b_number=b_number,
+            b_number_code=b_number and b_number.code,
+            b_callname=b_number and b_number.b_callname,
+            locality=locality,
+            locality_code=locality and locality.code,
+            locality_name=locality and locality.name,
+            postal_code=postal_code,
+            postal_code_code=postal_code and postal_code.code,
+            postal_code_name=postal_code and postal_code.name,
+            municipality=municipality,
+            municipality_code=municipality and municipality.code,
+            municipality_name=municipality and municipality.name,
+        )
+
+    addresses = Address.objects.using(db_alias).select_related(
+        'b_number', 'municipality', 'road__location__postal_code',
+    ).order_by('pk').iterator()
+    batch = []
+
+    for address in addresses:
+        batch.append(resolve(address))
+
+        if len(batch) >= BATCH_SIZE:
+            AddressResolution.objects.using(db_alias).bulk_create(batch)
+            batch = []
+
+    AddressResolution.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addrreg', '0005_event_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressResolution',
+            fields=[
+                ('address', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resolution', serialize=False, to='addrreg.Address')),
+                ('objectID', models.UUIDField(db_index=True)),
+                ('active', models.BooleanField(default=True)),
+                ('house_number', models.CharField(db_index=True, max_length=6, null=True)),
+                ('floor', models.CharField(max_length=2, null=True)),
+                ('room', models.CharField(max_length=6, null=True)),
+                ('road_code', models.PositiveIntegerField(db_index=True, null=True)),
+                ('road_name', models.CharField(db_index=True, max_length=34, null=True)),
+                ('b_number_code', models.CharField(db_index=True, max_length=8, null=True)),
+                ('b_callname', models.CharField(max_length=60, null=True)),
+                ('locality_code', models.PositiveSmallIntegerField(db_index=True, null=True)),
+                ('locality_name', models.CharField(db_index=True, max_length=60, null=True)),
+                ('postal_code_code', models.PositiveSmallIntegerField(db_index=True, null=True)),
+                ('postal_code_name', models.CharField(max_length=60, null=True)),
+                ('municipality_code', models.PositiveSmallIntegerField(db_index=True, null=True)),
+                ('municipality_name', models.CharField(db_index=True, max_length=60, null=True)),
+                ('b_number', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='addrreg.BNumber')),
+                ('locality', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='addrreg.Locality')),
+                ('municipality', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='addrreg.Municipality')),
+                ('postal_code', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='addrreg.PostalCode')),
+                ('road', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='addrreg.Road')),
+            ],
+            options={
+                'verbose_name': 'Address Resolution',
+                'verbose_name_plural': 'Address Resolutions',
+                'default_permissions': (),
+            },
+        ),
+        migrations.RunPython(resolve_addresses,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 08:21
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addrreg', '0006_address_resolution'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='addressresolution',
+            index_together=set([('road_name', 'house_number')]),
+        ),
+    ]
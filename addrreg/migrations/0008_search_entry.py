@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 08:24
+from __future__ import unicode_literals
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# a copy of the normalisation of addrreg.models.search at the time of
+# this migration, so that later changes to it do not alter what it does
+_TRANSLITERATIONS = str.maketrans({
+    'æ': 'ae',
+    'ø': 'o',
+    'ð': 'd',
+    'þ': 'th',
+    'ĸ': 'q',
+})
+
+MAX_TERM_LENGTH = 60
+
+
+def get_terms(values):
+    terms = set()
+
+    for value in values:
+        text = unicodedata.normalize(
+            'NFKD', (value or '').casefold().translate(_TRANSLITERATIONS),
+        )
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+
+        for word in re.findall(r'\w+', text):
+            terms.add(word[:MAX_TERM_LENGTH])
+            terms.update(
+                word[i:i + MAX_TERM_LENGTH] for i in range(len(word) - 1)
+            )
+
+    return terms
+
+
+INDEXED_FIELDS = {
+    'Municipality': ('name',),
+    'District': ('name',),
+    'PostalCode': ('name',),
+    'Locality': ('name',),
+    'BNumber': ('b_type', 'b_callname'),
+    'Road': ('name', 'shortname', 'alternate_name', 'cpr_name'),
+    'Address': ('house_number',),
+}
+
+
+def index_names(apps, schema_editor):
+    SearchEntry = apps.get_model('addrreg', 'SearchEntry')
+    db_alias = schema_editor.connection.alias
+
+    for model_name, fields in sorted(INDEXED_FIELDS.items()):
+        model = apps.get_model('addrreg', model_name)
+
+        SearchEntry.objects.using(db_alias).bulk_create(
+            SearchEntry(model=model_name.lower(), object_id=pk, term=term)
+            for pk, *values in model.objects.using(db_alias).values_list(
+                'pk', *fields
+            ).iterator()
+            for term in sorted(get_terms(values))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addrreg', '0007_address_resolution_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True,
+                                        serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=16)),
+                ('object_id', models.PositiveIntegerField()),
+                ('term', models.CharField(db_index=True, max_length=60)),
+            ],
+            options={
+                'verbose_name': 'Search Entry',
+                'verbose_name_plural': 'Search Entries',
+                'default_permissions': (),
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='searchentry',
+            index_together=set([('model', 'object_id')]),
+        ),
+        migrations.RunPython(index_names, migrations.RunPython.noop),
+    ]
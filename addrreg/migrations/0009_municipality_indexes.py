@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 08:29
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addrreg', '0008_search_entry'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='address',
+            index_together=set([('municipality', 'active', 'road')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='bnumber',
+            index_together=set([('municipality', 'active', 'code', 'b_type')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='locality',
+            index_together=set([('municipality', 'active', 'abbrev')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='road',
+            index_together=set([('municipality', 'active', 'name')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-17 09:03
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('addrreg', '0010_event_metrics_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='event',
+            index_together=set([('updated_type', 'receipt_obtained', 'receipt_errorcode', 'created', 'pushed', 'push_attempts'), ('updated_type', 'sequence')]),
+        ),
+    ]
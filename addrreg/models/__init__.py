@@ -2,6 +2,6 @@
 
 from __future__ import absolute_import, unicode_literals, print_function
 
-from . import base, data, temporal, events
+from . import base, data, temporal, events, resolution, search
 
 from .data import *
@@ -7,13 +7,17 @@ import operator
 import uuid
 import logging
 
-from django import forms
+from django import dispatch, forms, http
+from django.apps import apps
 from django.contrib import admin
-from django.core import validators
+from django.core import exceptions, validators
 from django.db import models
+from django.db.models import signals
 from django.utils.translation import ugettext_lazy as _
 from django_extensions import admin as admin_extensions
 
+from . import signals as addrreg_signals
+
 
 class ForeignKey(models.ForeignKey):
     '''Customised ForeignKey subclass with our defaults'''
@@ -26,14 +30,42 @@ class ForeignKey(models.ForeignKey):
         super().__init__(to=to, verbose_name=verbose_name, **kwargs)
 
 
-def _default_state():
+_state_ids = {}
+
+
+def get_state_id(code):
+    '''Return the primary key of the State with the given code, or
+    ``None`` if there is none.
+
+    The result is cached for the lifetime of the process, and
+    discarded whenever a State is written.
+
+    '''
     # avoid import cycle by using a local import
     from .. import models
 
     try:
-        return models.State.objects.get(code=0)
-    except models.State.DoesNotExist:
-        return None
+        return _state_ids[code]
+    except KeyError:
+        pass
+
+    _state_ids[code] = models.State.objects.filter(
+        code=code,
+    ).values_list('pk', flat=True).first()
+
+    return _state_ids[code]
+
+
+@dispatch.receiver(signals.post_save, sender='addrreg.State')
+@dispatch.receiver(signals.post_delete, sender='addrreg.State')
+@dispatch.receiver(addrreg_signals.post_bulk_save, sender='addrreg.State')
+@dispatch.receiver(signals.post_migrate)
+def _clear_state_ids(**kwargs):
+    _state_ids.clear()
+
+
+def _default_state():
+    return get_state_id(0)
 
 
 class AbstractModel(models.Model):
@@ -51,6 +83,34 @@ class AbstractModel(models.Model):
     active = models.BooleanField(_('Active'), default=True)
     note = models.CharField(_('Notes'), blank=True, null=True, max_length=255)
 
+    # the relations followed by __str__(), so that lists of objects
+    # may join them in advance
+    str_select_related = ()
+
+    @classmethod
+    def get_str_select_related(cls):
+        '''Return the relations followed by __str__(), including those
+        followed by the string representations of related objects.'''
+        paths = []
+
+        for path in cls.str_select_related:
+            related_model = cls
+
+            for name in path.split('__'):
+                related_model = related_model._meta.get_field(
+                    name,
+                ).related_model
+
+            paths.append(path)
+            paths += [
+                path + '__' + related_path
+                for related_path in getattr(related_model,
+                                            'get_str_select_related',
+                                            tuple)()
+            ]
+
+        return paths
+
     @classmethod
     def type_name(cls):
         return cls.__name__.lower()
@@ -165,18 +225,75 @@ class AdminBase(admin_extensions.ForeignKeyAutocompleteAdmin):
 
     superuser_only = False
 
+    def get_list_select_related(self, request):
+        '''Join everything shown in the list of objects, including the
+        relations followed by the string representations of related
+        objects, and by any methods declaring them.'''
+        paths = set()
+
+        for name in self.get_list_display(request):
+            if name == '__str__':
+                paths.update(self.model.get_str_select_related())
+                continue
+
+            try:
+                field = self.model._meta.get_field(name)
+            except (TypeError, exceptions.FieldDoesNotExist):
+                field = None
+
+            if field is None:
+                attr = name if callable(name) else (
+                    getattr(self, name, None) or
+                    getattr(self.model, name, None)
+                )
+                paths.update(getattr(attr, 'select_related', ()))
+
+            elif field.many_to_one or field.one_to_one:
+                paths.add(name)
+                paths.update(
+                    name + '__' + path
+                    for path in getattr(field.related_model,
+                                        'get_str_select_related', tuple)()
+                )
+
+        return sorted(paths)
+
     def get_readonly_fields(self, request, obj=None):
         fields = super().get_readonly_fields(request, obj)
         user = request.user
 
         if (
-                not (user.is_superuser or user.rights.count() > 1) and
+                not (user.is_superuser or
+                     len(self.get_municipality_ids(request)) > 1) and
                 hasattr(self.model, 'municipality')
         ):
             fields += ('municipality',)
 
         return fields
 
+    def get_municipality_ids(self, request):
+        '''Return the IDs of the municipalities the user may edit.
+
+        They are loaded once per request, as the permission checks of
+        even a single page need them repeatedly.
+
+        '''
+        try:
+            return request._municipality_ids
+        except AttributeError:
+            pass
+
+        if hasattr(request.user, 'rights'):
+            municipality_ids = frozenset(
+                request.user.rights.values_list('municipality', flat=True),
+            )
+        else:
+            municipality_ids = frozenset()
+
+        request._municipality_ids = municipality_ids
+
+        return municipality_ids
+
     def get_related_filter(self, remote_model, request):
         user = request.user
         filters = []
@@ -185,11 +302,13 @@ class AdminBase(admin_extensions.ForeignKeyAutocompleteAdmin):
             filters.append(models.Q(active=True))
 
         if not user.is_superuser:
+            municipality_ids = self.get_municipality_ids(request)
+
             if remote_model._meta.label == 'addrreg.Municipality':
-                filters.append(models.Q(rights__users=user))
+                filters.append(models.Q(pk__in=municipality_ids))
 
             if hasattr(remote_model, 'municipality'):
-                filters.append(models.Q(municipality__rights__users=user))
+                filters.append(models.Q(municipality_id__in=municipality_ids))
 
         return functools.reduce(operator.and_, filters)
 
@@ -207,7 +326,9 @@ class AdminBase(admin_extensions.ForeignKeyAutocompleteAdmin):
         qs = super().get_queryset(request)
 
         if not user.is_superuser and hasattr(self.model, 'municipality'):
-            qs = qs.filter(municipality__rights__users=user)
+            qs = qs.filter(
+                municipality_id__in=self.get_municipality_ids(request),
+            )
 
         return qs
 
@@ -215,32 +336,91 @@ class AdminBase(admin_extensions.ForeignKeyAutocompleteAdmin):
         user = request.user
 
         if not user.is_superuser and hasattr(self.model, 'municipality'):
-            queryset = queryset.filter(municipality__rights__users=user)
+            queryset = queryset.filter(
+                municipality_id__in=self.get_municipality_ids(request),
+            )
+
+        # avoid import cycle by using a local import
+        from . import search
+
+        return search.search(queryset, self.get_search_fields(request),
+                             search_term)
+
+    def foreignkey_autocomplete(self, request):
+        '''Like the autocomplete of django_extensions, but suggesting
+        objects from the in-memory autocomplete index where possible,
+        and otherwise searching the names through the search index.'''
+        # avoid import cycle by using a local import
+        from .. import autocomplete
+        from . import search
+
+        user = request.user
+        query = request.GET.get('q')
+        app_label = request.GET.get('app_label')
+        model_name = request.GET.get('model_name')
+        search_fields = request.GET.get('search_fields')
 
-        return super().get_search_results(request, queryset, search_term)
+        if not (query and app_label and model_name and search_fields):
+            return super().foreignkey_autocomplete(request)
+
+        remote_model = apps.get_model(app_label, model_name)
+
+        if (remote_model in autocomplete.INDEXED_FIELDS and
+                model_name not in self.related_string_functions):
+            if user.is_superuser:
+                municipality_ids = None
+            else:
+                municipality_ids = self.get_municipality_ids(request)
+
+            suggestions = autocomplete.get_index(remote_model).suggest(
+                query, municipality_ids, self.autocomplete_limit,
+            )
+
+            return http.HttpResponse(''.join(
+                '{}|{}\n'.format(label, pk) for label, pk in suggestions
+            ))
+
+        queryset, use_distinct = search.search(
+            remote_model._default_manager.filter(
+                self.get_related_filter(remote_model, request),
+            ),
+            search_fields.split(','),
+            query,
+        )
+
+        if use_distinct:
+            queryset = queryset.distinct()
+
+        if self.autocomplete_limit:
+            queryset = queryset[:self.autocomplete_limit]
+
+        to_string = self.related_string_functions.get(model_name, str)
+
+        return http.HttpResponse(''.join(
+            '{}|{}\n'.format(to_string(obj), obj.pk) for obj in queryset
+        ))
 
     def __has_municipality(self, request, obj=None):
         if request.user.is_superuser:
             return True
-        elif not hasattr(request.user, 'rights'):
-            return False
-        # can do this in general?
+
+        municipality_ids = self.get_municipality_ids(request)
 
         if not obj:
-            return (request.user.rights.all() and
+            return (bool(municipality_ids) and
                     hasattr(self.model, 'municipality'))
 
-        elif hasattr(obj, 'municipality'):
-            return request.user.rights.filter(
-                municipality=obj.municipality
-            ).exists()
+        elif hasattr(type(obj), 'municipality'):
+            return obj.municipality_id in municipality_ids
         else:
             return False
 
     def save_model(self, request, obj, form, change):
         if (hasattr(type(obj), 'municipality') and
-                not hasattr(obj, 'municipality')):
-            obj.municipality = request.user.rights.only().get().municipality
+                obj.municipality_id is None):
+            # users choosing a municipality have it in the form, so the
+            # user has rights to exactly one
+            (obj.municipality_id,) = self.get_municipality_ids(request)
 
         obj._registration_user = request.user
 
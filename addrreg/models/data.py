@@ -223,10 +223,13 @@ class DistrictAdmin(base.AdminBase):
     ) + base.AdminBase._fieldsets
 
     def related_localities(self, instance):
-        return util.render_list(instance.locality_set.all())
+        return util.render_list(Locality.objects.all(), {
+            'district__id__exact': instance.pk,
+        })
 
     related_localities.short_description = _('Localities')
 
+
 class PostalCode(base.AbstractModel,
                  metaclass=temporal.TemporalModelBase):
 
@@ -283,6 +286,11 @@ class Locality(base.AbstractModel,
         ordering = ('abbrev',)
         default_permissions = ()
 
+        # for listing the localities of some municipalities
+        index_together = [
+            ('municipality', 'active', 'abbrev'),
+        ]
+
     sumiffiik = base.SumiffiikIDField()
     sumiffiik_domain = base.SumiffiikDomainField(
         default='https://data.gl/najugaq/locality',
@@ -367,6 +375,11 @@ class BNumber(base.AbstractModel,
 
         ordering = ('code', 'b_type')
 
+        # for listing the B-numbers of some municipalities
+        index_together = [
+            ('municipality', 'active', 'code', 'b_type'),
+        ]
+
     sumiffiik = base.SumiffiikIDField()
     sumiffiik_domain = base.SumiffiikDomainField(
         default='https://data.gl/najugaq/number',
@@ -388,6 +401,8 @@ class BNumber(base.AbstractModel,
                                    verbose_name=_('Municipality'),
                                    null=False)
 
+    str_select_related = ('location',)
+
     def __str__(self):
         parts = [self.code]
         if self.b_callname:
@@ -454,10 +469,17 @@ class BNumberAdmin(base.AdminBase):
     ) + base.AdminBase._fieldsets
 
     def related_addresses(self, instance):
-        return util.render_list(instance.address_set.all())
+        return util.render_list(Address.objects.all(), {
+            'b_number__id__exact': instance.pk,
+        })
 
     related_addresses.short_description = _('Addresses')
 
+    def lookup_allowed(self, lookup, value):
+        # used by the link to all B-numbers of a road
+        return (lookup == 'address__road__id__exact' or
+                super().lookup_allowed(lookup, value))
+
 
 class Road(base.AbstractModel,
            metaclass=temporal.TemporalModelBase):
@@ -469,6 +491,11 @@ class Road(base.AbstractModel,
         ordering = ('name',)
         default_permissions = ()
 
+        # for listing the roads of some municipalities
+        index_together = [
+            ('municipality', 'active', 'name'),
+        ]
+
     sumiffiik = base.SumiffiikIDField()
     sumiffiik_domain = base.SumiffiikDomainField(
         default='https://data.gl/najugaq/road',
@@ -541,10 +568,9 @@ class RoadAdmin(base.AdminBase):
     ) + base.AdminBase._fieldsets
 
     def related_b_numbers(self, instance):
-        return util.render_list(
-            addr.b_number
-            for addr in instance.address_set.all(),
-        )
+        return util.render_list(BNumber.objects.distinct(), {
+            'address__road__id__exact': instance.pk,
+        })
 
     related_b_numbers.short_description = _('B-Numbers')
 
@@ -559,6 +585,11 @@ class Address(base.AbstractModel,
         ordering = 'road',
         default_permissions = ()
 
+        # for listing the addresses of some municipalities
+        index_together = [
+            ('municipality', 'active', 'road'),
+        ]
+
     sumiffiik = base.SumiffiikIDField()
     sumiffiik_domain = base.SumiffiikDomainField(
         default='https://data.gl/najugaq/address',
@@ -578,10 +609,13 @@ class Address(base.AbstractModel,
     road = base.ForeignKey(Road, _('Road'))
     municipality = base.ForeignKey(Municipality, _('Municipality'))
 
+    str_select_related = ('road',)
+
     def location(self):
         return self.road.location
 
     location.short_description = _('Locality')
+    location.select_related = ('road__location',)
 
     def __str__(self):
         if self.floor:
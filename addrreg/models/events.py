@@ -1,23 +1,55 @@
 # -*- mode: python; coding: utf-8 -*-
 
-import logging
 import uuid
 
 from datetime import datetime, timezone
 
-import requests
-
-from django.conf import settings
 from django.db import models, transaction
 
 from . import data
 from .. import util
 
 
+class EventSequence(models.Model):
+    '''The counter from which events draw their sequence numbers; it
+    has a single row.'''
+
+    value = models.BigIntegerField(default=0)
+
+    @classmethod
+    def allocate(cls, count=1):
+        '''Allocate ``count`` consecutive sequence numbers, returning the
+        first. This must happen within a transaction.
+
+        The update locks the counter until the transaction ends, so
+        transactions writing events commit in the order of their
+        sequence numbers, and no number becomes visible after a greater
+        one.
+
+        '''
+        if not cls.objects.filter(pk=1).update(
+                value=models.F('value') + count,
+        ):
+            cls.objects.create(pk=1, value=count)
+
+        return cls.objects.values_list('value', flat=True).get(pk=1) \
+            - count + 1
+
+
 class Event(models.Model):
+
+    class Meta(object):
+        index_together = [
+            # covers the aggregates of the metrics
+            ('updated_type', 'receipt_obtained', 'receipt_errorcode',
+             'created', 'pushed', 'push_attempts'),
+            # the latest event of each type, as autocompletion checks
+            ('updated_type', 'sequence'),
+        ]
+
     created = models.DateTimeField(
         db_index=True,
-        auto_now=True
+        auto_now_add=True
     )
     eventID = models.UUIDField()
     objectID = models.UUIDField(db_index=True, null=True)
@@ -25,19 +57,26 @@ class Event(models.Model):
     updated_type = models.CharField(max_length=32)
     receipt_obtained = models.DateTimeField(db_index=True, null=True)
     receipt_errorcode = models.CharField(max_length=64, null=True)
+    sequence = models.BigIntegerField(unique=True)
+
+    # outbox state, maintained by the push worker
+    pushed = models.DateTimeField(null=True)
+    push_attempts = models.PositiveIntegerField(default=0)
+    push_next_attempt = models.DateTimeField(null=True)
 
     @transaction.atomic(savepoint=False)
     def save(self, *args, **kwargs):
         if self.eventID is None:
             self.eventID = uuid.uuid4()
+        if self.sequence is None:
+            self.sequence = EventSequence.allocate()
         super(Event, self).save(*args, **kwargs)
 
     @staticmethod
     def create(item, saveItem=True):
         if hasattr(item, 'registrations'):
             for r in item.registrations.all():
-                event = Event.create(r)
-                transaction.on_commit(event.try_push)
+                Event.create(r)
 
         else:
             item.calculate_checksum(saveItem)
@@ -47,19 +86,40 @@ class Event(models.Model):
                 updated_registration=item.checksum
             )
             event.save()
-            transaction.on_commit(event.try_push)
+
+    @staticmethod
+    def create_all(items):
+        '''Create events for the given registrations, all of which must
+        have their checksums calculated, using one insert.'''
+        sequence = EventSequence.allocate(len(items))
+
+        events = [
+            Event(
+                eventID=uuid.uuid4(),
+                sequence=sequence + i,
+                objectID=item.objectID,
+                updated_type=item.type_name(),
+                updated_registration=item.checksum,
+            )
+            for i, item in enumerate(items)
+        ]
+
+        Event.objects.bulk_create(events)
+
+        return events
 
     def receipt(self, errorcode=None):
         self.receipt_obtained = datetime.now(timezone.utc)
         self.receipt_errorcode = errorcode
-        self.save()
+        self.save(update_fields=['receipt_obtained', 'receipt_errorcode'])
 
-    def format(self):
+    def format(self, item=None):
         cls = data.ALL_OBJECT_CLASSES[self.updated_type]
 
-        item = cls.Registrations.objects.get(
-            checksum=self.updated_registration
-        )
+        if item is None:
+            item = cls.Registrations.objects.get(
+                checksum=self.updated_registration
+            )
 
         return {
             "beskedVersion": "1.0",
@@ -73,39 +133,3 @@ class Event(models.Model):
                 },
             }
         }
-
-    def push(self, url):
-        return requests.post(
-            url,
-            proxies=settings.PROXIES,
-            data=util.dump_json(self.format()),
-            headers={'Content-Type': 'application/json'},
-            timeout=10,
-            verify=False
-        )
-
-    @property
-    def predecessors(self):
-        return Event.objects.filter(
-            objectID=self.objectID,
-            created__lt=self.created,
-        ).order_by('created')
-
-    @transaction.atomic(savepoint=False)
-    def try_push(self):
-        # never push during testing
-        if settings.TESTING or not settings.PUSH_URL:
-            return
-
-        try:
-            for predecessor in self.predecessors.filter(
-                    receipt_obtained__isnull=True,
-            ):
-                predecessor.push(settings.PUSH_URL).raise_for_status()
-
-            self.push(settings.PUSH_URL).raise_for_status()
-
-        except requests.RequestException:
-            logging.getLogger('django.request').exception(
-                'push notification failed'
-            )
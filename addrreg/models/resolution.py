@@ -0,0 +1,168 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import functools
+
+from django.db import models
+from django.db.models import signals
+from django.utils.translation import ugettext_lazy as _
+
+from . import data, signals as addrreg_signals
+
+# how to find the addresses affected by changes to each model
+DEPENDENCIES = {
+    data.Address: 'pk',
+    data.BNumber: 'b_number',
+    data.Road: 'road',
+    data.Locality: 'road__location',
+    data.PostalCode: 'road__location__postal_code',
+    data.Municipality: 'municipality',
+}
+
+
+def _reference(model):
+    return models.ForeignKey(model, models.DO_NOTHING, db_constraint=False,
+                             related_name='+', null=True)
+
+
+class AddressResolutionQuerySet(models.QuerySet):
+
+    def refresh(self, addresses, batch_size=500):
+        '''Recompute the rows of the given addresses, using three
+        queries for each batch.'''
+        pks = list(addresses.values_list('pk', flat=True))
+
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+
+            rows = [
+                AddressResolution.from_address(address)
+                for address in data.Address._base_manager.using(
+                    self.db,
+                ).filter(pk__in=batch).select_related(
+                    'b_number', 'municipality', 'road__location__postal_code',
+                )
+            ]
+
+            self.filter(address__in=batch).delete()
+            self.bulk_create(rows)
+
+
+class AddressResolution(models.Model):
+    '''
+    Read model holding each current address along with everything
+    needed to resolve it, so that looking up an address by any of its
+    parts is a single, indexed query.
+
+    The rows are maintained whenever an address or anything it refers
+    to is saved, and may be rebuilt with the
+    ``rebuild_address_resolution`` command.
+    '''
+
+    class Meta(object):
+        verbose_name = _('Address Resolution')
+        verbose_name_plural = _('Address Resolutions')
+
+        default_permissions = ()
+
+        # the usual lookup, by the API among others
+        index_together = [
+            ('road_name', 'house_number'),
+        ]
+
+    address = models.OneToOneField(data.Address, models.CASCADE,
+                                   primary_key=True,
+                                   related_name='resolution')
+    objectID = models.UUIDField(db_index=True)
+    active = models.BooleanField(default=True)
+
+    house_number = models.CharField(max_length=6, null=True, db_index=True)
+    floor = models.CharField(max_length=2, null=True)
+    room = models.CharField(max_length=6, null=True)
+
+    road = _reference(data.Road)
+    road_code = models.PositiveIntegerField(null=True, db_index=True)
+    road_name = models.CharField(max_length=34, null=True, db_index=True)
+
+    b_number = _reference(data.BNumber)
+    b_number_code = models.CharField(max_length=8, null=True,
+                                     db_index=True)
+    b_callname = models.CharField(max_length=60, null=True)
+
+    locality = _reference(data.Locality)
+    locality_code = models.PositiveSmallIntegerField(null=True,
+                                                     db_index=True)
+    locality_name = models.CharField(max_length=60, null=True,
+                                     db_index=True)
+
+    postal_code = _reference(data.PostalCode)
+    postal_code_code = models.PositiveSmallIntegerField(null=True,
+                                                        db_index=True)
+    postal_code_name = models.CharField(max_length=60, null=True)
+
+    municipality = _reference(data.Municipality)
+    municipality_code = models.PositiveSmallIntegerField(null=True,
+                                                         db_index=True)
+    municipality_name = models.CharField(max_length=60, null=True,
+                                         db_index=True)
+
+    objects = AddressResolutionQuerySet.as_manager()
+
+    def __str__(self):
+        return str(self.address_id)
+
+    @classmethod
+    def from_address(cls, address):
+        '''Create an unsaved row for the given address, which should have
+        its relations loaded.'''
+        b_number = address.b_number
+        municipality = address.municipality
+        road = address.road
+        locality = road and road.location
+        postal_code = locality and locality.postal_code
+
+        return cls(
+            address=address,
+            objectID=address.objectID,
+            active=address.active,
+            house_number=address.house_number,
+            floor=address.floor,
+            room=address.room,
+            road=road,
+            road_code=road and road.code,
+            road_name=road and road.name,
+            b_number=b_number,
+            b_number_code=b_number and b_number.code,
+            b_callname=b_number and b_number.b_callname,
+            locality=locality,
+            locality_code=locality and locality.code,
+            locality_name=locality and locality.name,
+            postal_code=postal_code,
+            postal_code_code=postal_code and postal_code.code,
+            postal_code_name=postal_code and postal_code.name,
+            municipality=municipality,
+            municipality_code=municipality and municipality.code,
+            municipality_name=municipality and municipality.name,
+        )
+
+
+def _refresh(lookup, sender, using, instance=None, objs=None, raw=False,
+             **kwargs):
+    # fixtures are loaded without regard to their order
+    if raw:
+        return
+
+    pks = [instance.pk] if instance is not None else [obj.pk for obj in objs]
+
+    AddressResolution.objects.using(using).refresh(
+        data.Address._base_manager.using(using).filter(**{
+            lookup + '__in': pks,
+        }),
+    )
+
+
+for model, lookup in DEPENDENCIES.items():
+    for signal in (signals.post_save, addrreg_signals.post_bulk_save):
+        signal.connect(functools.partial(_refresh, lookup), sender=model,
+                       weak=False)
@@ -0,0 +1,216 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import functools
+import operator
+import re
+import unicodedata
+
+from django.contrib.admin import utils as admin_utils
+from django.core import exceptions
+from django.db import models
+from django.db.models import signals
+from django.utils.translation import ugettext_lazy as _
+
+from . import data, signals as addrreg_signals
+
+# the names of each model covered by the index
+INDEXED_FIELDS = {
+    data.Municipality: ('name',),
+    data.District: ('name',),
+    data.PostalCode: ('name',),
+    data.Locality: ('name',),
+    data.BNumber: ('b_type', 'b_callname'),
+    data.Road: ('name', 'shortname', 'alternate_name', 'cpr_name'),
+    data.Address: ('house_number',),
+}
+
+# letters that do not decompose into a base letter and diacritics
+_TRANSLITERATIONS = str.maketrans({
+    'æ': 'ae',
+    'ø': 'o',
+    'ð': 'd',
+    'þ': 'th',
+    'ĸ': 'q',
+})
+
+MAX_TERM_LENGTH = 60
+
+
+def normalise(text):
+    '''Case-fold the given text and strip it of diacritics.'''
+    text = unicodedata.normalize(
+        'NFKD', text.casefold().translate(_TRANSLITERATIONS),
+    )
+
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenise(text):
+    return re.findall(r'\w+', normalise(text))
+
+
+def get_terms(values):
+    '''Return the terms to index for the given values, being every
+    suffix of at least two letters of each word, so that searching for
+    the prefix of a term finds any part of a word.'''
+    terms = set()
+
+    for value in values:
+        for word in tokenise(value or ''):
+            terms.add(word[:MAX_TERM_LENGTH])
+            terms.update(
+                word[i:i + MAX_TERM_LENGTH] for i in range(len(word) - 1)
+            )
+
+    return terms
+
+
+class SearchEntryQuerySet(models.QuerySet):
+
+    def refresh(self, model, objs):
+        '''Recompute the entries of the given objects.'''
+        type_name = model.type_name()
+        fields = INDEXED_FIELDS[model]
+
+        self.filter(
+            model=type_name,
+            object_id__in=[obj.pk for obj in objs],
+        ).delete()
+
+        self.bulk_create(
+            SearchEntry(model=type_name, object_id=obj.pk, term=term)
+            for obj in objs
+            for term in sorted(get_terms(
+                getattr(obj, field) for field in fields
+            ))
+        )
+
+    def matching(self, model, token):
+        '''Return the IDs of the objects of the given model with a word
+        containing the given normalised token.'''
+        return self.filter(
+            model=model.type_name(),
+            term__startswith=token[:MAX_TERM_LENGTH],
+        ).values('object_id')
+
+
+class SearchEntry(models.Model):
+    '''
+    Index of the names of the objects of each model, normalised to
+    make searches insensitive to case and diacritics, and to allow
+    searching for any part of a word as the prefix of an indexed term.
+    '''
+
+    class Meta(object):
+        verbose_name = _('Search Entry')
+        verbose_name_plural = _('Search Entries')
+
+        default_permissions = ()
+
+        index_together = [
+            ('model', 'object_id'),
+        ]
+
+    model = models.CharField(max_length=16)
+    object_id = models.PositiveIntegerField()
+    term = models.CharField(max_length=MAX_TERM_LENGTH, db_index=True)
+
+    objects = SearchEntryQuerySet.as_manager()
+
+    def __str__(self):
+        return self.term
+
+
+def _get_search_filter(model, search_fields, word):
+    # like ModelAdmin.get_search_results(), but searching the index for
+    # any names covered by it
+    queries = []
+    indexed = set()
+
+    for search_field in search_fields:
+        if search_field[0] in '^=@':
+            prefix, path = search_field[0], search_field[1:]
+        else:
+            prefix, path = '', search_field
+
+        parts = path.split('__')
+        target = model
+
+        for part in parts[:-1]:
+            target = target._meta.get_field(part).related_model
+
+        if prefix != '=' and parts[-1] in INDEXED_FIELDS.get(target, ()):
+            indexed.add((target, '__'.join((parts[:-1] or ['pk']) + ['in'])))
+
+        elif prefix == '=':
+            # skip values that cannot equal the field, such as text
+            # given for a code
+            try:
+                target._meta.get_field(parts[-1]).to_python(word)
+            except exceptions.ValidationError:
+                continue
+
+            queries.append(models.Q(**{path + '__iexact': word}))
+
+        else:
+            lookup = {
+                '^': 'istartswith',
+                '@': 'search',
+                '': 'icontains',
+            }[prefix]
+
+            queries.append(models.Q(**{path + '__' + lookup: word}))
+
+    tokens = tokenise(word)
+
+    for target, lookup in sorted(indexed, key=operator.itemgetter(1)):
+        if tokens:
+            queries.append(functools.reduce(operator.and_, (
+                models.Q(**{
+                    lookup: SearchEntry.objects.matching(target, token),
+                })
+                for token in tokens
+            )))
+
+    return functools.reduce(operator.or_, queries, models.Q(pk__in=[]))
+
+
+def search(queryset, search_fields, search_term):
+    '''Filter the given queryset to the objects matching each word of
+    ``search_term`` in any of the ``search_fields``, as the admin
+    does, and return it along with whether it needs to be distinct.'''
+    model = queryset.model
+    search_fields = [str(search_field) for search_field in search_fields]
+
+    for word in search_term.split():
+        queryset = queryset.filter(
+            _get_search_filter(model, search_fields, word),
+        )
+
+    use_distinct = any(
+        admin_utils.lookup_needs_distinct(model._meta,
+                                          search_field.lstrip('^=@'))
+        for search_field in search_fields
+    )
+
+    return queryset, use_distinct
+
+
+def _refresh(sender, instance=None, objs=None, **kwargs):
+    SearchEntry.objects.refresh(
+        sender, [instance] if instance is not None else objs,
+    )
+
+
+def _delete(sender, instance, **kwargs):
+    SearchEntry.objects.filter(
+        model=sender.type_name(), object_id=instance.pk,
+    ).delete()
+
+
+for model in INDEXED_FIELDS:
+    signals.post_save.connect(_refresh, sender=model)
+    addrreg_signals.post_bulk_save.connect(_refresh, sender=model)
+    signals.post_delete.connect(_delete, sender=model)
@@ -0,0 +1,10 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from django.db.models import signals
+
+# sent by TemporalManager.bulk_save() after each batch, which bypasses
+# the per-object pre_save and post_save signals
+post_bulk_save = signals.ModelSignal(providing_args=['objs', 'using'],
+                                     use_caching=True)
@@ -7,16 +7,244 @@ import hashlib
 import json
 
 from django.conf import settings
-from django.core import exceptions, serializers
+from django.core import exceptions
 from django.db import models, transaction
 from django.utils import timezone
 from django.utils.text import format_lazy
 from django.utils.translation import ugettext_lazy as _
 
+from . import signals
 from .events import Event
+from .. import addreg_serializer, util
 from ..util import json_serialize_object
 
 
+class TemporalManager(models.Manager):
+    '''
+    Manager for temporal models, adding set-based writes.
+    '''
+
+    def bulk_save(self, objs, user=None, batch_size=500):
+        '''Save the given objects, as :py:meth:`save` would, but using a
+        handful of statements for each batch rather than several per
+        object. Objects that were never saved are inserted, the others
+        are updated; either way, their open registrations are closed and
+        new ones are inserted, along with their events. Each batch is
+        saved in its own transaction, unless one is already in progress,
+        and followed by a :py:data:`signals.post_bulk_save` signal.
+
+        '''
+        objs = list(objs)
+
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+
+            self._bulk_save_batch(batch, user)
+
+            signals.post_bulk_save.send(sender=self.model, objs=batch,
+                                        using=self.db)
+
+        return objs
+
+    def as_of(self, timestamp):
+        '''Return the registrations of this model that were current at
+        the given instant; see :py:meth:`RegistrationQuerySet.as_of`.'''
+        return self.model.Registrations.objects.using(self.db).as_of(
+            timestamp,
+        )
+
+    def _related_objects(self, objs):
+        '''Fetch the targets of all foreign keys of the given objects,
+        using one query per field.'''
+        related = {}
+
+        for field in self.model._meta.fields:
+            if not isinstance(field, models.ForeignKey):
+                continue
+
+            related[field.name] = field.remote_field.model._base_manager \
+                .using(self.db).in_bulk({
+                    getattr(obj, field.attname) for obj in objs
+                    if getattr(obj, field.attname) is not None
+                })
+
+        return related
+
+    @transaction.atomic(savepoint=False)
+    def _bulk_save_batch(self, objs, user):
+        regcls = self.model.Registrations
+        now = timezone.now()
+
+        for obj in objs:
+            if obj.registration_from and obj.registration_from >= now:
+                raise exceptions.ValidationError(
+                    'registration ends before it starts!'
+                )
+
+            obj.registration_from = now
+
+        added = [obj for obj in objs if obj._state.adding]
+        changed = [obj for obj in objs if not obj._state.adding]
+
+        if added:
+            self.bulk_create(added)
+
+            # not all backends report the keys of inserted rows
+            missing = {obj.objectID: obj for obj in added if obj.pk is None}
+
+            if missing:
+                for objectID, pk in self.filter(
+                        objectID__in=list(missing),
+                ).values_list('objectID', 'pk'):
+                    missing[objectID].pk = pk
+
+            for obj in added:
+                obj._state.adding = False
+                obj._state.db = self.db
+
+        if changed:
+            util.bulk_update(self.get_queryset(), changed, [
+                field.name for field in self.model._meta.concrete_fields
+                if not field.primary_key
+            ])
+
+            regcls.objects.filter(
+                object__in=[obj.pk for obj in changed],
+                registration_to=None,
+            ).update(
+                registration_to=now,
+            )
+
+        related = self._related_objects(objs)
+        registrations = []
+
+        for obj in objs:
+            obj._maybe_intercept()
+
+            try:
+                obj_user = obj._registration_user
+                del obj._registration_user
+            except AttributeError:
+                obj_user = user
+
+            registration = obj._make_registration(obj_user, related)
+            registration.check_timestamps(now)
+            registration.calculate_checksum(save=False)
+
+            registrations.append(registration)
+
+        regcls.objects.bulk_create(registrations)
+        Event.create_all(registrations)
+
+
+class RegistrationQuerySet(models.QuerySet):
+    '''
+    QuerySet for registration tables.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._as_of = None
+        self._as_of_fields = ()
+
+    def _clone(self, **kwargs):
+        clone = super()._clone(**kwargs)
+        clone._as_of = self._as_of
+        clone._as_of_fields = self._as_of_fields
+
+        return clone
+
+    def as_of(self, timestamp):
+        '''Restrict the registrations to those current at the given
+        instant, i.e. those registered at or before it, and not ended
+        until after it.'''
+        clone = self.filter(
+            models.Q(registration_to__isnull=True) |
+            models.Q(registration_to__gt=timestamp),
+            registration_from__lte=timestamp,
+        )
+        clone._as_of = timestamp
+
+        return clone
+
+    def resolve(self, *fields):
+        '''Resolve the given foreign keys of each registration to the
+        registration of their target current at the instant given to
+        :py:meth:`as_of`, storing it as ``<field>_as_of``. Without any
+        fields, all foreign keys to temporal models are resolved.
+
+        Each field requires one additional query for every 500
+        distinct targets.
+
+        '''
+        if self._as_of is None:
+            raise TypeError('resolve() requires as_of()')
+
+        if not fields:
+            fields = [
+                field.name for field in self.model._meta.fields
+                if field.is_relation and field.name != 'object' and
+                hasattr(field.remote_field.model, 'Registrations')
+            ]
+
+        clone = self._clone()
+        clone._as_of_fields = tuple(fields)
+
+        return clone
+
+    def _fetch_all(self):
+        resolve = self._result_cache is None and self._as_of_fields
+
+        super()._fetch_all()
+
+        if resolve and issubclass(self._iterable_class,
+                                  models.query.ModelIterable):
+            self._resolve_as_of(self._result_cache)
+
+    def _resolve_as_of(self, registrations, batch_size=500):
+        for name in self._as_of_fields:
+            field = self.model._meta.get_field(name)
+            regcls = field.remote_field.model.Registrations
+            queryset = regcls.objects.using(self.db).as_of(self._as_of)
+            object_ids = sorted(
+                {getattr(r, field.attname) for r in registrations} - {None},
+            )
+            targets = {}
+
+            for start in range(0, len(object_ids), batch_size):
+                targets.update(
+                    (target.objectID, target)
+                    for target in queryset.filter(
+                        objectID__in=object_ids[start:start + batch_size],
+                    )
+                )
+
+            for registration in registrations:
+                setattr(registration, name + '_as_of',
+                        targets.get(getattr(registration, field.attname)))
+
+    def by_checksum(self, checksums, batch_size=500):
+        '''Look up the registrations with the given checksums, returning
+        a dictionary mapping each checksum found to its registration. The
+        user they refer to is loaded by the same query; formatting them
+        needs nothing else.
+
+        '''
+        checksums = sorted(set(checksums))
+        registrations = {}
+
+        for start in range(0, len(checksums), batch_size):
+            registrations.update(
+                (registration.checksum, registration)
+                for registration in self.filter(
+                    checksum__in=checksums[start:start + batch_size],
+                ).select_related('registration_user')
+            )
+
+        return registrations
+
+
 class TemporalModelBase(models.base.ModelBase):
     """
     Meta-class for generating...
@@ -44,6 +272,8 @@ class TemporalModelBase(models.base.ModelBase):
                 verbose_name=_('Registration Time'),
             )
 
+            objects = TemporalManager()
+
             @property
             def registrations(self):
                 return self.Registrations.objects.filter(object=self)
@@ -63,6 +293,35 @@ class TemporalModelBase(models.base.ModelBase):
                     if not exclude or field.name not in exclude
                 }
 
+            def _make_registration(self, user, related=None):
+                '''
+                Create an unsaved registration of the current state of this
+                object. If given, `related` maps each foreign key to the
+                already loaded objects it may refer to.
+                '''
+                fields = self.__get_field_dict(
+                    exclude=('id',) + tuple(related or ()),
+                )
+
+                for name, objs in (related or {}).items():
+                    field = self._meta.get_field(name)
+                    pk = getattr(self, field.attname)
+
+                    if pk is None:
+                        fields[name] = None
+                    else:
+                        try:
+                            fields[name] = objs[pk]
+                        except KeyError:
+                            raise field.remote_field.model.DoesNotExist
+
+                return regcls(
+                    registration_to=None,
+                    object=self,
+                    registration_user=user,
+                    **fields
+                )
+
             def _maybe_intercept(self):
 
                 '''
@@ -114,12 +373,7 @@ class TemporalModelBase(models.base.ModelBase):
 
                 self._maybe_intercept()
 
-                regcls.objects.create(
-                    registration_to=None,
-                    object=self,
-                    registration_user=user,
-                    **self.__get_field_dict(exclude=('id',))
-                )
+                self._make_registration(user).save()
 
             def format(self, timestamp=None):
                 registrations = self.registrations
@@ -127,8 +381,6 @@ class TemporalModelBase(models.base.ModelBase):
                     registrations = registrations.filter(
                         registration_from__gte=timestamp
                     )
-                for registration in registrations.all():
-                    registration.calculate_checksum()
                 return {
                     'type': self.type_name(),
                     'objectID': self.objectID,
@@ -144,10 +396,14 @@ class TemporalModelBase(models.base.ModelBase):
                 }
 
             def natural_key(self):
+                return self.natural_key_for(self.objectID)
+
+            @classmethod
+            def natural_key_for(cls, objectID):
                 return {
-                    'uuid': self.objectID,
+                    'uuid': objectID,
                     'domaene': "https://data.gl/gladdreg/%s/1/rest/" %
-                               self.type_name()
+                               cls.type_name()
                 }
 
         regattrs = attrs.copy()
@@ -195,7 +451,10 @@ class TemporalModelBase(models.base.ModelBase):
 
                 process = True
 
-            if process:
+            # fields declared on the class itself must not be shared
+            # with the registration model, or they would end up
+            # belonging to it rather than the main model
+            if process or regattrs.get(field.name) is field:
                 regattrs[field.name] = type(field)(*fieldargs, **field_kwargs)
 
         class RegistrationModel(*bases):
@@ -236,6 +495,8 @@ class TemporalModelBase(models.base.ModelBase):
                                         editable=False, max_length=64,
                                         verbose_name=_('Checksum'))
 
+            objects = RegistrationQuerySet.as_manager()
+
             modelclass = modelcls
 
             @classmethod
@@ -247,14 +508,7 @@ class TemporalModelBase(models.base.ModelBase):
                     'Registrations tables are append-only'
                 )
 
-            @transaction.atomic(savepoint=False)
-            def save(self, *args, **kwargs):
-
-                if self.pk is None:
-                    Event.create(self, False)
-
-                now = timezone.now()
-
+            def check_timestamps(self, now):
                 if self.registration_from > now:
                     raise exceptions.ValidationError(
                         'registration begins in the future!'
@@ -271,12 +525,32 @@ class TemporalModelBase(models.base.ModelBase):
                             'registration ends before it starts!'
                         )
 
+            @transaction.atomic(savepoint=False)
+            def save(self, *args, **kwargs):
+
+                if self.pk is None:
+                    # calculate the checksum once, as the registration
+                    # is written; reading it never changes it
+                    self.calculate_checksum(save=False)
+                    Event.create(self, False)
+
+                self.check_timestamps(timezone.now())
+
                 super().save(*args, **kwargs)
 
+            @classmethod
+            def _get_fields(cls, obj, exclude=()):
+                # compiled on first use, as the targets of foreign keys
+                # may not exist when the class is created
+                cls._get_fields = staticmethod(
+                    addreg_serializer.compile_fields(cls),
+                )
+
+                return cls._get_fields(obj, exclude)
+
             @property
             def fields(self):
-                obj = serializers.serialize('python_with_identity', [self])
-                return dict(obj[0]['fields'])
+                return self._get_fields(self)
 
             def calculate_checksum(self, save=True):
                 if self.checksum is None:
@@ -292,13 +566,11 @@ class TemporalModelBase(models.base.ModelBase):
                         self.save()
 
             def format(self):
-                fields = self.fields
-                for exclusion in [
+                fields = self._get_fields(self, exclude=(
                     'registration_from', 'registration_to', 'valid_from',
                     'valid_to', 'checksum', 'object', 'objectID',
                     'registration_user',
-                ]:
-                    fields.pop(exclusion)
+                ))
 
                 # we need a string rather than the foreign key object
                 if self.registration_user:
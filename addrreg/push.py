@@ -0,0 +1,307 @@
+# -*- mode: python; coding: utf-8 -*-
+
+'''Delivery of events to the Datafordeler.
+
+Saving an object merely inserts its events; they form an outbox that
+the ``push_worker`` command drains afterwards. Events for the same
+object are always delivered in the order they were created, and a
+failed delivery blocks the remaining events of that object until it
+is retried.
+
+'''
+
+import collections
+import concurrent.futures
+import datetime
+import logging
+import time
+
+import requests
+import requests.adapters
+
+from django import db
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .models import data
+from .models.events import Event
+from . import util
+
+logger = logging.getLogger(__name__)
+
+Result = collections.namedtuple('Result',
+                                ('event', 'ok', 'error', 'duration'))
+
+
+def format_events(events):
+    '''Yield each event along with its serialised message, or the
+    exception raised while formatting it.
+
+    The registrations are fetched in one query per type, rather than
+    one per event.
+
+    '''
+    checksums = collections.defaultdict(set)
+
+    for event in events:
+        checksums[event.updated_type].add(event.updated_registration)
+
+    registrations = {
+        type_name: data.ALL_OBJECT_CLASSES[type_name].Registrations.objects
+        .by_checksum(type_checksums)
+        for type_name, type_checksums in checksums.items()
+    }
+
+    for event in events:
+        try:
+            registration = registrations[event.updated_type].get(
+                event.updated_registration,
+            )
+
+            if registration is None:
+                raise LookupError('no registration with checksum {!r}'.format(
+                    event.updated_registration,
+                ))
+
+            yield event, util.dump_json(event.format(registration))
+
+        except Exception as exc:
+            yield event, exc
+
+
+class Statistics(object):
+    '''Throughput and latency of the requests made by a pusher.'''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = []
+        self.pushed = 0
+        self.failed = 0
+
+    def add(self, result):
+        if result.duration is not None:
+            self.durations.append(result.duration)
+
+        if result.ok:
+            self.pushed += 1
+        else:
+            self.failed += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        durations = sorted(self.durations)
+
+        lines = [
+            'Pushed {} events in {:.1f}s ({:.1f} events/s), '
+            '{} failed.'.format(
+                self.pushed, elapsed,
+                self.pushed / elapsed if elapsed else 0, self.failed,
+            ),
+        ]
+
+        if durations:
+            lines.append(
+                'Latency: p50 {:.0f}ms, p90 {:.0f}ms, p99 {:.0f}ms, '
+                'max {:.0f}ms.'.format(*(
+                    1000 * util.percentile(durations, percent)
+                    for percent in (50, 90, 99, 100)
+                ))
+            )
+
+        return '\n'.join(lines)
+
+
+class Pusher(object):
+    '''Push pending events to ``url`` using a pool of ``workers``
+    threads sharing one pool of HTTP connections.
+
+    All database access happens in the calling thread; the workers
+    only perform the requests.
+
+    '''
+
+    def __init__(self, url, workers=4, batch_size=500, timeout=10,
+                 backoff=5, max_backoff=3600):
+        self.url = url
+        self.workers = workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=workers,
+        )
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.statistics = Statistics()
+
+    def pending(self, now=None):
+        '''Return the events awaiting delivery, oldest first, skipping
+        every object whose oldest pending event is waiting for a retry.
+
+        '''
+        if now is None:
+            now = timezone.now()
+
+        events = Event.objects.filter(
+            pushed__isnull=True,
+            receipt_obtained__isnull=True,
+        )
+
+        blocked = events.filter(
+            objectID__isnull=False,
+            push_next_attempt__gt=now,
+        ).values('objectID')
+
+        return events.exclude(
+            push_next_attempt__gt=now,
+        ).exclude(
+            objectID__in=blocked,
+        ).order_by('created', 'pk')
+
+    def get_delay(self, attempts):
+        '''Seconds to wait before the next attempt, given the number of
+        attempts made so far.'''
+        return min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def post(self, data):
+        r = self.session.post(
+            self.url,
+            proxies=settings.PROXIES,
+            data=data,
+            headers={'Content-Type': 'application/json'},
+            timeout=self.timeout,
+            verify=False,
+        )
+
+        r.raise_for_status()
+
+    def push_partition(self, partition):
+        '''Deliver the events of one object in order, stopping at the
+        first failure.'''
+        results = []
+
+        for event, data in partition:
+            started = time.perf_counter()
+
+            try:
+                self.post(data)
+            except requests.RequestException as exc:
+                ok, error = False, exc
+            else:
+                ok, error = True, None
+
+            results.append(
+                Result(event, ok, error, time.perf_counter() - started),
+            )
+
+            if not ok:
+                break
+
+        return results
+
+    def push_events(self, events, executor):
+        '''Deliver the given events, each object on a worker of its own
+        with its events in order, and return the results.
+
+        Events following one that could not be formatted are held back,
+        and omitted from the results, just like those following a
+        failed delivery.
+
+        '''
+        partitions = collections.OrderedDict()
+        failed = set()
+        results = []
+
+        for event, data in format_events(events):
+            key = event.objectID or event.pk
+
+            if key in failed:
+                continue
+            elif isinstance(data, Exception):
+                logger.error('failed to format event %s: %s',
+                             event.eventID, data)
+                results.append(Result(event, False, data, None))
+                failed.add(key)
+            else:
+                partitions.setdefault(key, []).append((event, data))
+
+        futures = [
+            executor.submit(self.push_partition, partition)
+            for partition in partitions.values()
+        ]
+
+        for future in concurrent.futures.as_completed(futures):
+            results += future.result()
+
+        for result in results:
+            self.statistics.add(result)
+
+        return results
+
+    def push_batch(self, executor):
+        '''Deliver one batch of pending events and record the outcome,
+        returning the amount of events attempted.'''
+        events = list(self.pending()[:self.batch_size])
+        self.record(self.push_events(events, executor))
+
+        return len(events)
+
+    def record(self, results):
+        '''Record the outcome of the given results in the outbox,
+        scheduling a retry of each failed event.'''
+        now = timezone.now()
+
+        succeeded = [result.event.pk for result in results if result.ok]
+
+        if succeeded:
+            Event.objects.filter(pk__in=succeeded).update(
+                pushed=now,
+                push_attempts=models.F('push_attempts') + 1,
+                push_next_attempt=None,
+            )
+
+        for event, ok, error, duration in results:
+            if ok:
+                continue
+
+            attempts = event.push_attempts + 1
+            delay = self.get_delay(attempts)
+
+            logger.warning('push of event %s failed, attempt %d, '
+                           'retrying in %ds: %s',
+                           event.eventID, attempts, delay, error)
+
+            Event.objects.filter(pk=event.pk).update(
+                push_attempts=attempts,
+                push_next_attempt=now + datetime.timedelta(seconds=delay),
+            )
+
+    def run(self, once=False, poll_interval=5):
+        '''Push events until interrupted or, if ``once`` is set, until
+        nothing remains that can be pushed right now.
+
+        Returns the amount of events attempted.
+
+        '''
+        total = 0
+
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            while True:
+                # like a request, discard connections that have gone away
+                db.close_old_connections()
+
+                count = self.push_batch(executor)
+                total += count
+
+                if not count:
+                    if once:
+                        return total
+
+                    time.sleep(poll_interval)
@@ -0,0 +1,135 @@
+# -*- mode: python; coding: utf-8 -*-
+
+'''Snapshots of the current registrations of each type.
+
+A snapshot is a gzip-compressed file of newline-delimited JSON. The
+first line is a header, giving the type, the time of generation and
+the sequence number of the latest event at that time, from which
+clients may follow ``changes``; each of the following lines is a
+current registration, formatted as by ``get/<type>/<checksums>``.
+
+Snapshots are generated incrementally: objects with events following
+the sequence number of the previous snapshot are read anew from the
+database, whereas all others are copied from the previous snapshot.
+As events commit in the order of their sequence numbers, this catches
+every change, however long its transaction took. Deleting an object
+ends its registrations without an event, so objects no longer current
+are dropped as well.
+
+'''
+
+import gzip
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .models import data
+from .models.events import Event
+from . import util
+
+
+def get_path(type_name):
+    return os.path.join(settings.SNAPSHOT_DIR,
+                        '{}.ndjson.gz'.format(type_name))
+
+
+def read_header(path):
+    '''Return the header of the snapshot at the given path, or ``None``
+    if there is none.'''
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as fp:
+            return json.loads(fp.readline())
+    except FileNotFoundError:
+        return None
+
+
+def _read_registrations(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as fp:
+        # skip the header
+        next(fp)
+
+        for line in fp:
+            yield json.loads(line)['entity']['uuid'], line
+
+
+def write(type_name, full=False, batch_size=500):
+    '''Write a snapshot of the given type, incrementally unless ``full``
+    is set or no previous snapshot exists; return its header and the
+    amount of registrations in it.
+
+    The file is replaced atomically, so readers see either the previous
+    snapshot or the new one.
+
+    '''
+    regcls = data.ALL_OBJECT_CLASSES[type_name].Registrations
+    path = get_path(type_name)
+    previous = None if full else read_header(path)
+
+    # determine what we cover prior to reading anything
+    header = {
+        'type': type_name,
+        'generated': timezone.now(),
+        'sequence': Event.objects.aggregate(
+            models.Max('sequence'),
+        )['sequence__max'] or 0,
+    }
+
+    current = regcls.objects.filter(
+        registration_to=None,
+    ).select_related('registration_user')
+
+    os.makedirs(settings.SNAPSHOT_DIR, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=settings.SNAPSHOT_DIR,
+                                     prefix='.' + type_name)
+
+    try:
+        with os.fdopen(fd, 'wb') as raw, \
+                gzip.open(raw, 'wt', encoding='utf-8') as fp:
+            fp.write(util.dump_json(header) + '\n')
+            count = 0
+
+            if previous is None:
+                for registration in current.order_by().iterator():
+                    fp.write(util.dump_json(registration.format()) + '\n')
+                    count += 1
+
+            else:
+                changed = sorted(set(Event.objects.filter(
+                    updated_type=type_name,
+                    sequence__gt=previous['sequence'],
+                ).values_list('objectID', flat=True)))
+
+                skipped = {str(object_id) for object_id in changed}
+                alive = {
+                    str(object_id)
+                    for object_id in current.values_list('objectID',
+                                                         flat=True)
+                }
+
+                for object_id, line in _read_registrations(path):
+                    if object_id in alive and object_id not in skipped:
+                        fp.write(line)
+                        count += 1
+
+                for start in range(0, len(changed), batch_size):
+                    for registration in current.filter(
+                        objectID__in=changed[start:start + batch_size],
+                    ).order_by():
+                        fp.write(
+                            util.dump_json(registration.format()) + '\n',
+                        )
+                        count += 1
+
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return header, count
@@ -0,0 +1,251 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import re
+from unittest import mock
+
+from django import apps, db, test
+from django.conf import settings
+from django.contrib import admin
+from django.test import utils
+from django.utils import translation
+
+from .. import models, util
+from .util import DUMMY_DOMAIN
+
+
+class AdminTests(test.TestCase):
+
+    def setUp(self):
+        self.user = apps.apps.get_model(
+            settings.AUTH_USER_MODEL,
+        ).objects.create_user(
+            'user', 'user@example.com', 'password', is_staff=True,
+        )
+
+        self.state = models.State.objects.create(
+            id=0,
+            state_id=0,
+            name='Good',
+            code=1,
+        )
+        self.mun = models.Municipality.objects.create(
+            name='Sermersooq',
+            code=955,
+            abbrev='SQ',
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        models.MunicipalityRights.objects.create(
+            municipality=self.mun,
+        ).users.add(self.user)
+
+        self.locality = models.Locality.objects.create(
+            name='Nuuk',
+            code=600,
+            municipality=self.mun,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.road = models.Road.objects.create(
+            name='Aqqusinersuaq',
+            code=1,
+            location=self.locality,
+            municipality=self.mun,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.b_number = models.BNumber.objects.create(
+            code='B-1',
+            location=self.locality,
+            municipality=self.mun,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.addresses = [
+            models.Address.objects.create(
+                house_number=str(i),
+                road=self.road,
+                b_number=self.b_number,
+                municipality=self.mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            for i in range(10)
+        ]
+
+    def _get(self, path):
+        self.client.force_login(self.user)
+
+        with utils.CaptureQueriesContext(db.connection) as ctx:
+            response = self.client.get(path)
+
+        self.assertEquals(response.status_code, 200, path)
+
+        return [query['sql'] for query in ctx.captured_queries]
+
+    def test_rights_queries(self):
+        paths = [
+            '/admin/',
+            '/admin/addrreg/',
+            '/admin/addrreg/address/',
+            '/admin/addrreg/address/?q=Aqqusinersuaq',
+            '/admin/addrreg/address/add/',
+            '/admin/addrreg/address/{}/change/'.format(
+                self.addresses[0].pk,
+            ),
+            '/admin/addrreg/road/',
+            '/admin/addrreg/road/?q=Aqqusinersuaq',
+            '/admin/addrreg/bnumber/',
+            '/admin/addrreg/locality/',
+        ]
+
+        # the rights of the user are loaded once per request, and
+        # everything else filters on the IDs of the municipalities
+        for path in paths:
+            queries = self._get(path)
+
+            self.assertEquals(
+                len([
+                    sql for sql in queries
+                    if 'FROM "addrreg_municipalityrights"' in sql
+                ]),
+                1,
+                path,
+            )
+            self.assertEquals(
+                [
+                    sql for sql in queries
+                    if 'JOIN "addrreg_municipalityrights"' in sql and
+                    'FROM "addrreg_municipalityrights"' not in sql
+                ],
+                [],
+                path,
+            )
+
+    def _add_objects(self, count):
+        for i in range(count):
+            locality = models.Locality.objects.create(
+                name='Locality {}'.format(i),
+                code=i + 1000,
+                municipality=self.mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            road = models.Road.objects.create(
+                name='Road {}'.format(i),
+                code=i + 1000,
+                location=locality,
+                municipality=self.mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            b_number = models.BNumber.objects.create(
+                code='B-{}'.format(i + 1000),
+                location=locality,
+                municipality=self.mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            models.Address.objects.create(
+                house_number='1',
+                road=road,
+                b_number=b_number,
+                municipality=self.mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+
+    def test_list_select_related(self):
+        request = test.RequestFactory().get('/')
+        request.user = self.user
+
+        self.assertEquals(
+            admin.site._registry[models.Address].get_list_select_related(
+                request,
+            ),
+            ['municipality', 'road', 'road__location', 'state'],
+        )
+        self.assertEquals(
+            admin.site._registry[models.BNumber].get_list_select_related(
+                request,
+            ),
+            ['location', 'municipality', 'state'],
+        )
+
+    def test_changelist_queries(self):
+        self.user.is_superuser = True
+        self.user.save()
+
+        paths = [
+            '/admin/addrreg/{}/'.format(model._meta.model_name)
+            for model in models.ALL_OBJECT_CLASSES.values()
+        ]
+
+        counts = [len(self._get(path)) for path in paths]
+
+        self._add_objects(20)
+
+        # the amount of queries for a page does not depend on its rows
+        self.assertEquals([len(self._get(path)) for path in paths], counts)
+
+    def _get_links(self, path):
+        self.client.force_login(self.user)
+
+        content = self.client.get(path).content.decode('utf-8')
+
+        return re.findall(r'<li>\s*<a href="([^"]*)">([^<]*)</a>', content)
+
+    @mock.patch.object(util, 'RENDER_LIST_LIMIT', 5)
+    def test_related_lists(self):
+        self.user.is_superuser = True
+        self.user.save()
+
+        path = '/admin/addrreg/bnumber/{}/change/'.format(self.b_number.pk)
+
+        with translation.override(settings.LANGUAGE_CODE):
+            show_all = translation.ugettext('Show all')
+
+        # the addresses share their road, so they follow their creation
+        self.assertEquals(
+            self._get_links(path),
+            [
+                ('/admin/addrreg/address/{}/change/'.format(address.pk),
+                 str(address))
+                for address in self.addresses[:5]
+            ] + [
+                ('/admin/addrreg/address/?b_number__id__exact={}'.format(
+                    self.b_number.pk,
+                ), show_all),
+            ],
+        )
+
+        count = len(self._get(path))
+
+        self._add_objects(10)
+
+        # a road has the B-numbers of its addresses
+        models.Address.objects.update(road=self.road)
+
+        links = self._get_links(
+            '/admin/addrreg/road/{}/change/'.format(self.road.pk),
+        )
+
+        self.assertEquals(
+            [label for link, label in links],
+            ['B-1 (Nuuk)'] + [
+                'B-{} (Locality {})'.format(1000 + i, i) for i in range(4)
+            ] + [show_all],
+        )
+
+        # and the link to all of them works
+        response = self.client.get(links[-1][0])
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.context['cl'].result_count, 11)
+
+        models.Address.objects.update(b_number=self.b_number)
+
+        # the amount of queries does not depend on the related objects
+        self.assertEquals(len(self._get(path)), count)
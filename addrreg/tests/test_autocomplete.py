@@ -0,0 +1,174 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from django import apps, test
+from django.conf import settings
+
+from .. import autocomplete, models
+from .util import DUMMY_DOMAIN
+
+
+class AutocompleteTests(test.TestCase):
+
+    def setUp(self):
+        # the event sequence restarts with each test
+        autocomplete._indexes.clear()
+
+        user_model = apps.apps.get_model(settings.AUTH_USER_MODEL)
+
+        self.superuser = user_model.objects.create_superuser(
+            'root', 'root@example.com', 'password',
+        )
+        self.user = user_model.objects.create_user(
+            'user', 'user@example.com', 'password', is_staff=True,
+        )
+
+        self.state = models.State.objects.create(
+            id=0,
+            state_id=0,
+            name='Good',
+            code=1,
+        )
+
+        self.localities = []
+        self.roads = []
+
+        for i, name in enumerate(['Nuuk', 'Ilulissat']):
+            mun = models.Municipality.objects.create(
+                name='Kommune {}'.format(i),
+                code=i,
+                abbrev=str(i),
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            locality = models.Locality.objects.create(
+                name=name,
+                code=i,
+                municipality=mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+
+            self.localities.append(locality)
+            self.roads.append(models.Road.objects.create(
+                name='Aqqusinersuaq',
+                code=i,
+                location=locality,
+                municipality=mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            ))
+
+            if not i:
+                models.MunicipalityRights.objects.create(
+                    municipality=mun,
+                ).users.add(self.user)
+
+        self.b_number = models.BNumber.objects.create(
+            code='B-1',
+            b_callname='Blok P',
+            location=self.localities[0],
+            municipality=self.localities[0].municipality,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+
+    def _autocomplete(self, user, model_name, q):
+        self.client.force_login(user)
+
+        response = self.client.get(
+            '/admin/addrreg/address/foreignkey_autocomplete/',
+            {
+                'q': q,
+                'app_label': 'addrreg',
+                'model_name': model_name,
+                'search_fields': 'name',
+            },
+        )
+
+        self.assertEquals(response.status_code, 200)
+
+        return response.content.decode('utf-8').splitlines()
+
+    def test_suggest(self):
+        index = autocomplete.get_index(models.Road)
+
+        self.assertEquals(
+            index.suggest('aqqu'),
+            [(str(road), road.pk) for road in self.roads],
+        )
+        self.assertEquals(
+            index.suggest('AQQUSINERSUAQ 1'),
+            [(str(self.roads[1]), self.roads[1].pk)],
+        )
+        self.assertEquals(
+            index.suggest('qusi'),
+            [],
+        )
+        self.assertEquals(
+            index.suggest('aqqu', [self.roads[1].municipality_id]),
+            [(str(self.roads[1]), self.roads[1].pk)],
+        )
+        self.assertEquals(index.suggest('aqqu', limit=1),
+                          [(str(self.roads[0]), self.roads[0].pk)])
+
+        # once built, suggestions only check whether the index is
+        # up-to-date
+        with self.assertNumQueries(1):
+            autocomplete.get_index(models.Road).suggest('aqqu')
+
+    def test_rights(self):
+        self.assertEquals(
+            self._autocomplete(self.superuser, 'road', 'aqq'),
+            ['{}|{}'.format(road, road.pk) for road in self.roads],
+        )
+        self.assertEquals(
+            self._autocomplete(self.user, 'road', 'aqq'),
+            ['{}|{}'.format(self.roads[0], self.roads[0].pk)],
+        )
+        self.assertEquals(
+            self._autocomplete(self.user, 'locality', 'ilu'),
+            [],
+        )
+
+    def test_invalidation(self):
+        self.assertEquals(
+            self._autocomplete(self.user, 'bnumber', 'blok'),
+            ['B-1 (Blok P) (Nuuk)|{}'.format(self.b_number.pk)],
+        )
+
+        self.localities[0].name = 'Godthåb'
+        self.localities[0].save()
+
+        self.assertEquals(
+            self._autocomplete(self.user, 'bnumber', 'godthab'),
+            ['B-1 (Blok P) (Godthåb)|{}'.format(self.b_number.pk)],
+        )
+
+        # saves in other processes are detected through their events
+        index = autocomplete.get_index(models.Road)
+
+        models.Road.objects.filter(pk=self.roads[0].pk).update(
+            name='Vejen',
+        )
+
+        self.assertIs(autocomplete.get_index(models.Road), index)
+
+        # events for models the index does not depend on are ignored
+        models.events.Event.objects.create(
+            updated_type='address',
+            updated_registration='0',
+        )
+
+        self.assertIs(autocomplete.get_index(models.Road), index)
+
+        models.events.Event.objects.create(
+            updated_type='road',
+            updated_registration='0',
+        )
+
+        self.assertEquals(
+            autocomplete.get_index(models.Road).suggest('vej'),
+            [('Vejen (0)', self.roads[0].pk)],
+        )
@@ -0,0 +1,57 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from unittest import mock
+
+from django import db, test
+from django.conf import settings
+
+from .. import connections
+
+
+class ConnectionTests(test.TransactionTestCase):
+
+    def test_settings(self):
+        self.assertEquals(
+            settings.DATABASES['default']['CONN_MAX_AGE'],
+            settings.DATABASE_CONN_MAX_AGE,
+        )
+        self.assertTrue(settings.DATABASES['default']['CONN_HEALTH_CHECKS'])
+
+    def test_pool_state(self):
+        db.connection.ensure_connection()
+
+        state = connections.pool_state()['default']
+
+        self.assertEquals(state['vendor'], db.connection.vendor)
+        self.assertTrue(state['connected'])
+        self.assertGreaterEqual(state['age'], 0)
+        self.assertEquals(state['max_age'], settings.DATABASE_CONN_MAX_AGE)
+        self.assertTrue(state['health_checks'])
+
+    def test_health_checks(self):
+        db.connection.ensure_connection()
+
+        # connections in recent use are not checked
+        connections._record_use()
+
+        with mock.patch.object(db.connection, 'is_usable') as is_usable:
+            connections.check_connections()
+
+        is_usable.assert_not_called()
+
+        db.connection.used_at -= connections.MAX_IDLE
+
+        with mock.patch.object(db.connection, 'close') as close:
+            with mock.patch.object(db.connection, 'is_usable',
+                                   return_value=True):
+                connections.check_connections()
+
+            close.assert_not_called()
+
+            with mock.patch.object(db.connection, 'is_usable',
+                                   return_value=False):
+                connections.check_connections()
+
+            close.assert_called_once_with()
@@ -2,7 +2,10 @@
 
 from __future__ import absolute_import, unicode_literals, print_function
 
+import io
+
 from django import test
+from django.core import management
 
 from .. import models
 from .util import DUMMY_DOMAIN
@@ -83,3 +86,63 @@ class CreationTests(test.TransactionTestCase):
         self.assertEquals(self.addr.b_number.municipality.name, 'Aarhus')
         self.assertEquals(str(self.addr),
                           '42Z Hans Hartvig Seedorffs Stræde (1337), 13, mf')
+
+    def test_default_state(self):
+        # the state is looked up once, and only once
+        with self.assertNumQueries(1):
+            for i in range(10):
+                self.assertIsNone(models.Municipality().state_id)
+
+        default = models.State.objects.create(
+            state_id=0,
+            name='Default',
+            code=0,
+        )
+
+        with self.assertNumQueries(1):
+            for i in range(10):
+                self.assertEquals(models.Municipality().state_id, default.pk)
+
+        default.code = 2
+        default.save()
+
+        self.assertIsNone(models.Municipality().state_id)
+
+        default, = models.State.objects.bulk_save([
+            models.State(state_id=0, name='Bulk', code=0),
+        ])
+
+        self.assertEquals(models.Municipality().state_id, default.pk)
+
+    def test_benchmark(self):
+        stdout = io.StringIO()
+
+        management.call_command('benchmark', 'construct', 'as-of', 'lookup',
+                                'connections',
+                                count=10, versions=3, stdout=stdout)
+
+        self.assertIn('construct municipality: 10 iterations',
+                      stdout.getvalue())
+        self.assertIn('as-of scan of 10 roads: 5 iterations',
+                      stdout.getvalue())
+        self.assertRegex(stdout.getvalue(),
+                         r'as-of lookup: 10 iterations .* 10 queries')
+        self.assertRegex(stdout.getvalue(),
+                         r'lookup get requests: 10 iterations .* 10 queries')
+        self.assertRegex(
+            stdout.getvalue(),
+            r'lookup batch requests of 1000: 10 iterations .* 10 queries',
+        )
+        self.assertRegex(
+            stdout.getvalue(),
+            r'connections persistent /monitor/database: 10 iterations .* '
+            r'20 queries',
+        )
+
+        # the benchmarks leave no trace
+        self.assertEquals(
+            models.Municipality.objects.count(), 0,
+        )
+        self.assertEquals(
+            models.Road.Registrations.objects.count(), 0,
+        )
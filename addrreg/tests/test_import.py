@@ -2,7 +2,9 @@
 
 from __future__ import absolute_import, unicode_literals, print_function
 
+import io
 import os
+import uuid
 
 import openpyxl
 
@@ -10,6 +12,7 @@ from django import test
 from django.conf import settings
 from django.utils import translation
 
+from .. import models
 from ..management.commands import import_
 
 
@@ -57,3 +60,89 @@ class VerifyImport(test.SimpleTestCase):
 
             self.assertEquals(t['stateda'], str(e.label))
             self.assertEquals(t['code'], e.value)
+
+
+class BatchedImportTests(test.TransactionTestCase):
+    reset_sequences = True
+
+    @staticmethod
+    def _make_workbook(sheets):
+        wb = openpyxl.Workbook()
+        wb.remove_sheet(wb.active)
+
+        for title, rows in sheets:
+            sheet = wb.create_sheet(title)
+
+            for row in rows:
+                sheet.append(row)
+
+        fp = io.BytesIO()
+        wb.save(fp)
+        fp.seek(0)
+
+        return fp
+
+    def _import(self, **kwargs):
+        domain = 'https://data.gl/naujat/municipality/v1'
+
+        fp = self._make_workbook([
+            ('state', [
+                ('UID', 'statestate', 'state', 'code'),
+                (99991, 2, 'Aktiv', 0),
+                (99992, 2, 'Passiv', 1),
+            ]),
+            ('municipality', [
+                ('UID', 'state', 'name', 'abbrev', 'code',
+                 'sumiiffik_ID', 'sumiiffik_domain'),
+            ] + [
+                (i, 1, name, name and name[:4], i,
+                 '{%s}' % uuid.uuid4(), domain)
+                for i, name in enumerate([
+                    'Kommune Kujalleq',
+                    'Kommuneqarfik Sermersooq',
+                    None,
+                    'Qeqqata Kommunia',
+                    'Avannaata Kommunia',
+                ], 1)
+            ]),
+        ])
+
+        import_.import_spreadsheet(fp, interactive=False, **kwargs)
+
+    def test_batched(self):
+        self._import(chunk_size=2)
+
+        self.assertEquals(models.State.objects.count(), 2)
+        self.assertEquals(
+            list(models.Municipality.objects.order_by('id').values_list(
+                'id', 'abbrev', 'state__name',
+            )),
+            [
+                (1, 'Komm', 'Aktiv'),
+                (2, 'Komm', 'Aktiv'),
+                (4, 'Qeqq', 'Aktiv'),
+                (5, 'Avan', 'Aktiv'),
+            ],
+        )
+        self.assertEquals(
+            models.Municipality.Registrations.objects.filter(
+                checksum__isnull=False,
+            ).count(),
+            4,
+        )
+        self.assertEquals(
+            models.events.Event.objects.filter(
+                updated_type='municipality',
+            ).count(),
+            4,
+        )
+
+    def test_row_by_row(self):
+        self._import(chunk_size=0)
+
+        self.assertEquals(
+            list(models.Municipality.objects.order_by('id').values_list(
+                'id', flat=True,
+            )),
+            [1, 2, 4, 5],
+        )
@@ -0,0 +1,162 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+from django import db, http, test
+from django.core.exceptions import MiddlewareNotUsed
+
+from .. import metrics, middleware, models
+from .util import DUMMY_DOMAIN
+
+
+class InstrumentationTests(test.TestCase):
+
+    def setUp(self):
+        for histogram in metrics.REQUEST_HISTOGRAMS.values():
+            histogram.clear()
+
+        self.state = models.State.objects.create(
+            id=0,
+            state_id=0,
+            name='Good',
+            code=1,
+        )
+        self.mun = models.Municipality.objects.create(
+            name='Sermersooq',
+            code=955,
+            abbrev='SQ',
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+
+    def _get_metrics(self, view):
+        return {
+            line.split('{')[0]: float(line.rsplit(' ', 1)[1])
+            for line in metrics.get_metrics().splitlines()
+            if '{{view="{}"}}'.format(view) in line
+        }
+
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            middleware.InstrumentationMiddleware(None)
+
+        self.client.get('/changes')
+
+        self.assertEquals(self._get_metrics('changes'), {})
+
+    @test.override_settings(INSTRUMENTATION=True,
+                            INSTRUMENTATION_SLOW_REQUEST=60)
+    def test_histograms(self):
+        for i in range(3):
+            response = self.client.get('/changes')
+
+        values = self._get_metrics('changes')
+
+        self.assertEquals(values['addrreg_request_queries_count'], 3)
+        # one query for the events, and one for each type
+        self.assertEquals(values['addrreg_request_queries_sum'], 9)
+        self.assertEquals(values['addrreg_response_size_bytes_sum'],
+                          3 * len(response.content))
+        self.assertEquals(values['addrreg_request_duration_seconds_count'],
+                          3)
+        self.assertEquals(values['addrreg_request_sql_seconds_count'], 3)
+        self.assertEquals(values['addrreg_request_python_seconds_count'], 3)
+
+        # requests not reaching any view are recorded as well
+        self.client.get('/nothing')
+
+        self.assertEquals(
+            self._get_metrics('<unresolved>')['addrreg_request_queries_count'],
+            1,
+        )
+
+    @test.override_settings(INSTRUMENTATION=True,
+                            INSTRUMENTATION_SLOW_REQUEST=60)
+    def test_streaming(self):
+        view = 'addrreg.views.ListChecksumView'
+
+        response = self.client.get('/listChecksums')
+
+        self.assertTrue(response.streaming)
+
+        # nothing is recorded until the stream is consumed
+        self.assertEquals(self._get_metrics(view), {})
+
+        content = b''.join(response.streaming_content)
+
+        values = self._get_metrics(view)
+
+        self.assertEquals(values['addrreg_request_queries_count'], 1)
+        # the queries for each object class happen while streaming
+        self.assertGreaterEqual(values['addrreg_request_queries_sum'], 7)
+        self.assertEquals(values['addrreg_response_size_bytes_sum'],
+                          len(content))
+
+        # closing a stream without consuming it records it as well
+        self.client.get('/listChecksums').close()
+
+        values = self._get_metrics(view)
+
+        self.assertEquals(values['addrreg_request_queries_count'], 2)
+        self.assertEquals(values['addrreg_response_size_bytes_sum'],
+                          len(content))
+
+    @test.override_settings(INSTRUMENTATION=True,
+                            INSTRUMENTATION_SLOW_REQUEST=60)
+    def test_many_queries(self):
+        # more queries than Django keeps in its log
+        def get_response(request):
+            with db.connection.cursor() as cursor:
+                for i in range(9001):
+                    cursor.execute('SELECT 1')
+
+            return http.HttpResponse()
+
+        instrumentation = middleware.InstrumentationMiddleware(get_response)
+
+        for i in range(2):
+            instrumentation(test.RequestFactory().get('/'))
+
+        values = self._get_metrics('<unresolved>')
+
+        self.assertEquals(values['addrreg_request_queries_count'], 2)
+        self.assertEquals(values['addrreg_request_queries_sum'], 2 * 9001)
+
+    @test.override_settings(INSTRUMENTATION=True,
+                            INSTRUMENTATION_SLOW_REQUEST=0)
+    def test_slow_requests(self):
+        with self.assertLogs('addrreg.middleware', 'WARNING') as logs:
+            self.client.get('/changes')
+
+        self.assertRegex(logs.output[0],
+                         r'slow request to GET /changes \(changes\): '
+                         r'\d+ms, 3 queries in \d+ms, \d+ bytes')
+
+        # the most repeated queries follow, ignoring those made once
+        with self.assertLogs('addrreg.middleware', 'WARNING') as logs:
+            middleware.InstrumentationMiddleware.log_slow_request(
+                test.RequestFactory().get('/admin/'), 'admin:index',
+                {'duration': 1, 'sql': 0.5, 'queries': 4, 'size': 0},
+                [
+                    {'sql': 'SELECT 1', 'time': '0.010'},
+                    {'sql': 'SELECT 2 FROM t WHERE x = 1', 'time': '0.020'},
+                    {'sql': 'SELECT 2 FROM t WHERE x = 2', 'time': '0.020'},
+                    {'sql': 'SELECT 2 FROM t WHERE x = 3', 'time': '0.020'},
+                ],
+            )
+
+        self.assertEquals(
+            logs.output[0].splitlines()[1:],
+            ['  3 times in 60ms: SELECT ? FROM t WHERE x = ?'],
+        )
+
+    def test_get_shape(self):
+        self.assertEquals(
+            middleware.get_shape(
+                'SELECT "a"."id" FROM "addrreg_event" "a" WHERE '
+                '"a"."sequence" > 42 AND "a"."type" = \'it\'\'s\' AND '
+                '"a"."id" IN (1, 2, 3.5)'
+            ),
+            'SELECT "a"."id" FROM "addrreg_event" "a" WHERE '
+            '"a"."sequence" > ? AND "a"."type" = ? AND "a"."id" IN (...)',
+        )
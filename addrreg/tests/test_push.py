@@ -0,0 +1,310 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import contextlib
+import http.server
+import io
+import json
+import socketserver
+import threading
+
+import freezegun
+
+from django import test
+from django.core import management
+from django.utils import timezone
+
+from .. import models, push, util
+from .util import DUMMY_DOMAIN
+
+
+class StubServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+
+        self.lock = threading.Lock()
+        self.received = []
+        self.statuses = []
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(*self.server_address)
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        message = json.loads(self.rfile.read(length).decode('utf-8'))
+
+        with self.server.lock:
+            if self.server.statuses:
+                status = self.server.statuses.pop(0)
+            else:
+                status = 200
+
+            if status == 200:
+                self.server.received.append(message['eventID'])
+
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class PushTests(test.TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self):
+        self.server = StubServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        state = models.State.objects.create(
+            id=0,
+            state_id=0,
+            name='Good',
+            code=1,
+        )
+
+        with freezegun.freeze_time('2001-01-01'):
+            self.muns = [
+                models.Municipality.objects.create(
+                    name=name,
+                    code=code,
+                    state=state,
+                    sumiffiik_domain=DUMMY_DOMAIN,
+                )
+                for code, name in [(20, 'Aarhus'), (30, 'Odense')]
+            ]
+
+        for i in range(3):
+            with freezegun.freeze_time('2001-01-0{}'.format(i + 2)):
+                for mun in self.muns:
+                    mun.note = 'Note {}'.format(i)
+                    mun.save()
+
+    def _get_event_ids(self, mun, **kwargs):
+        return [
+            str(event_id)
+            for event_id in models.events.Event.objects.filter(
+                objectID=mun.objectID, **kwargs
+            ).order_by('created', 'pk').values_list('eventID', flat=True)
+        ]
+
+    def test_saves_do_not_push(self):
+        self.assertEquals(
+            models.events.Event.objects.filter(pushed__isnull=False).count(),
+            0,
+        )
+        self.assertEquals(self.server.received, [])
+
+    def test_push(self):
+        pusher = push.Pusher(self.server.url, workers=4, batch_size=3)
+
+        self.assertEquals(pusher.run(once=True), 9)
+
+        self.assertFalse(
+            models.events.Event.objects.filter(pushed__isnull=True).exists(),
+        )
+
+        for mun in self.muns:
+            event_ids = self._get_event_ids(mun)
+
+            self.assertEquals(len(event_ids), 4)
+            self.assertEquals(
+                [e for e in self.server.received if e in event_ids],
+                event_ids,
+            )
+
+        # nothing left to do
+        self.assertEquals(pusher.run(once=True), 0)
+
+    def test_retry(self):
+        pusher = push.Pusher(self.server.url, workers=1)
+
+        # the state was created last; fail the first municipality
+        self.server.statuses = [500]
+
+        before = timezone.now()
+        pusher.run(once=True)
+
+        failed, blocked = self.muns
+
+        # the failed object is held back in its entirety...
+        self.assertEquals(self._get_event_ids(failed, pushed__isnull=False),
+                          [])
+
+        event = models.events.Event.objects.filter(
+            objectID=failed.objectID,
+        ).order_by('created', 'pk').first()
+
+        self.assertEquals(event.push_attempts, 1)
+        self.assertGreater(event.push_next_attempt, before)
+
+        # ...whereas the others are unaffected
+        self.assertEquals(
+            self._get_event_ids(blocked, pushed__isnull=False),
+            self._get_event_ids(blocked),
+        )
+
+        # retry once the delay has passed
+        with freezegun.freeze_time(event.push_next_attempt):
+            pusher.run(once=True)
+
+        self.assertEquals(
+            [e for e in self.server.received
+             if e in self._get_event_ids(failed)],
+            self._get_event_ids(failed),
+        )
+
+        event.refresh_from_db()
+        self.assertEquals(event.push_attempts, 2)
+        self.assertIsNotNone(event.pushed)
+
+    def test_format_failure(self):
+        failed, other = self.muns
+
+        # the second event of the first municipality cannot be formatted
+        event_ids = self._get_event_ids(failed)
+        models.events.Event.objects.filter(eventID=event_ids[1]).update(
+            updated_registration='0' * 32,
+        )
+
+        pusher = push.Pusher(self.server.url, workers=4)
+
+        with self.assertLogs('addrreg.push', 'ERROR'):
+            pusher.run(once=True)
+
+        # its later events are held back until the next run...
+        self.assertEquals(
+            [e for e in self.server.received if e in event_ids],
+            event_ids[:1],
+        )
+        self.assertEquals(self._get_event_ids(failed, pushed__isnull=True),
+                          event_ids[1:])
+
+        # ...whereas the others are unaffected
+        self.assertEquals(self._get_event_ids(other, pushed__isnull=True),
+                          [])
+
+    def test_command(self):
+        stdout = io.StringIO()
+
+        management.call_command('push_worker', url=self.server.url,
+                                once=True, stdout=stdout)
+
+        self.assertEquals(stdout.getvalue().strip(), 'Attempted 9 events.')
+        self.assertEquals(len(self.server.received), 9)
+
+    def test_format_events(self):
+        events = list(models.events.Event.objects.all())
+
+        # one query for each type
+        with self.assertNumQueries(2):
+            messages = dict(push.format_events(events))
+
+        for event in events:
+            self.assertEquals(
+                messages[event],
+                util.dump_json(event.format()),
+            )
+
+    def test_push_command(self):
+        stdout = io.StringIO()
+
+        with contextlib.redirect_stdout(stdout), \
+                self.settings(PUSH_URL=self.server.url + '/'):
+            management.call_command('push', host=self.server.url, path='/',
+                                    parallel=4, batch_size=3,
+                                    failfast=True)
+
+        self.assertIn('Pushed 9 events', stdout.getvalue())
+        self.assertIn('Latency: p50', stdout.getvalue())
+
+        for mun in self.muns:
+            event_ids = self._get_event_ids(mun)
+
+            self.assertEquals(
+                [e for e in self.server.received if e in event_ids],
+                event_ids,
+            )
+
+        # the command records its deliveries in the outbox, so that the
+        # worker does not deliver them again
+        self.assertFalse(
+            models.events.Event.objects.filter(pushed__isnull=True).exists(),
+        )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            management.call_command('push_worker', url=self.server.url,
+                                    once=True, stdout=io.StringIO())
+
+        self.assertEquals(len(self.server.received), 9)
+
+    def test_push_command_failure(self):
+        # fail the first event of the first municipality, in the first
+        # of several batches
+        self.server.statuses = [500]
+
+        stdout = io.StringIO()
+
+        with contextlib.redirect_stdout(stdout), \
+                self.settings(PUSH_URL=self.server.url + '/'):
+            management.call_command('push', host=self.server.url, path='/',
+                                    parallel=1, batch_size=2)
+
+        failed, other = self.muns
+
+        self.assertIn('Pushed 5 events', stdout.getvalue())
+        self.assertIn('1 failed', stdout.getvalue())
+        self.assertIn('Skipped 3 events', stdout.getvalue())
+
+        # the later events of the failed object were held back...
+        self.assertEquals(
+            [e for e in self.server.received
+             if e in self._get_event_ids(failed)],
+            [],
+        )
+        self.assertEquals(self._get_event_ids(failed, pushed__isnull=False),
+                          [])
+        self.assertEquals(
+            self._get_event_ids(failed, push_next_attempt__isnull=False),
+            self._get_event_ids(failed)[:1],
+        )
+
+        # ...whereas the others were delivered
+        self.assertEquals(
+            self._get_event_ids(other, pushed__isnull=False),
+            self._get_event_ids(other),
+        )
+
+    def test_push_command_elsewhere(self):
+        # pushing anywhere but to PUSH_URL leaves the outbox alone
+        with contextlib.redirect_stdout(io.StringIO()), \
+                self.settings(PUSH_URL=self.server.url + '/other'):
+            management.call_command('push', host=self.server.url, path='/',
+                                    full=True)
+
+        self.assertEquals(len(self.server.received), 9)
+        self.assertFalse(
+            models.events.Event.objects.filter(pushed__isnull=False).exists(),
+        )
+
+    def test_push_command_failfast(self):
+        self.server.statuses = [500]
+
+        with self.assertRaises(management.CommandError), \
+                contextlib.redirect_stdout(io.StringIO()):
+            management.call_command('push', host=self.server.url, path='/',
+                                    failfast=True)
@@ -0,0 +1,276 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import importlib
+import io
+import json
+
+from django import apps, db, test
+from django.core import management
+
+from .. import lookup, models
+from ..models.resolution import AddressResolution
+from .util import DUMMY_DOMAIN
+
+
+class ResolutionTests(test.TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self):
+        self.state = models.State.objects.create(
+            id=0,
+            state_id=0,
+            name='Good',
+            code=1,
+        )
+
+        self.mun = models.Municipality.objects.create(
+            name='Sermersooq',
+            code=955,
+            abbrev='SQ',
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.pc = models.PostalCode.objects.create(
+            name='Nuuk',
+            code=3900,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.locality = models.Locality.objects.create(
+            name='Nuuk',
+            code=600,
+            municipality=self.mun,
+            postal_code=self.pc,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.road = models.Road.objects.create(
+            name='Aqqusinersuaq',
+            code=1,
+            location=self.locality,
+            municipality=self.mun,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.b_number = models.BNumber.objects.create(
+            code='B-1',
+            b_callname='Blok P',
+            location=self.locality,
+            municipality=self.mun,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.addresses = [
+            models.Address.objects.create(
+                house_number=house_number,
+                floor=floor,
+                road=self.road,
+                b_number=self.b_number,
+                municipality=self.mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            for house_number, floor in [('1', None), ('2', '3')]
+        ]
+
+    def _get_values(self, *fields):
+        return list(
+            AddressResolution.objects.order_by('address').values_list(*fields)
+        )
+
+    def test_creation(self):
+        resolution = AddressResolution.objects.get(house_number='2')
+
+        self.assertEquals(resolution.address, self.addresses[1])
+        self.assertEquals(resolution.objectID, self.addresses[1].objectID)
+        self.assertEquals(
+            (resolution.floor, resolution.road_name, resolution.road_code,
+             resolution.b_number_code, resolution.b_callname,
+             resolution.locality_name, resolution.locality_code,
+             resolution.postal_code_code, resolution.postal_code_name,
+             resolution.municipality_name, resolution.municipality_code),
+            ('3', 'Aqqusinersuaq', 1, 'B-1', 'Blok P', 'Nuuk', 600,
+             3900, 'Nuuk', 'Sermersooq', 955),
+        )
+
+        # resolving an address takes a single query
+        with self.assertNumQueries(1):
+            resolution = AddressResolution.objects.get(
+                road_name='Aqqusinersuaq',
+                house_number='1',
+                postal_code_code=3900,
+            )
+
+        self.assertEquals(resolution.address_id, self.addresses[0].pk)
+
+    def test_updates(self):
+        self.road.name = 'Vejen'
+        self.road.save()
+
+        self.assertEquals(self._get_values('road_name'),
+                          [('Vejen',), ('Vejen',)])
+
+        self.pc.name = 'Godthåb'
+        self.pc.save()
+
+        self.assertEquals(self._get_values('postal_code_name'),
+                          [('Godthåb',), ('Godthåb',)])
+
+        self.addresses[0].floor = '1'
+        self.addresses[0].save()
+
+        self.assertEquals(self._get_values('house_number', 'floor'),
+                          [('1', '1'), ('2', '3')])
+
+        self.mun.name = 'Kommuneqarfik Sermersooq'
+        self.b_number.b_callname = 'Blok Q'
+
+        models.Municipality.objects.bulk_save([self.mun])
+        models.BNumber.objects.bulk_save([self.b_number])
+
+        self.assertEquals(self._get_values('municipality_name', 'b_callname'),
+                          [('Kommuneqarfik Sermersooq', 'Blok Q')] * 2)
+
+        self.addresses[1].delete()
+
+        self.assertEquals(self._get_values('address'),
+                          [(self.addresses[0].pk,)])
+
+    def test_rebuild(self):
+        expected = list(AddressResolution.objects.order_by('pk').values())
+
+        AddressResolution.objects.all().delete()
+
+        stdout = io.StringIO()
+        management.call_command('rebuild_address_resolution', stdout=stdout)
+
+        self.assertEquals(stdout.getvalue().strip(), 'Resolved 2 addresses.')
+        self.assertEquals(
+            list(AddressResolution.objects.order_by('pk').values()),
+            expected,
+        )
+
+    def test_migration(self):
+        expected = list(AddressResolution.objects.order_by('pk').values())
+
+        AddressResolution.objects.all().delete()
+
+        migration = importlib.import_module(
+            'addrreg.migrations.0006_address_resolution',
+        )
+
+        with db.connection.schema_editor() as schema_editor:
+            migration.resolve_addresses(apps.apps, schema_editor)
+
+        self.assertEquals(
+            list(AddressResolution.objects.order_by('pk').values()),
+            expected,
+        )
+
+    def test_lookup(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/lookup/address', {
+                'road': 'Aqqusinersuaq',
+                'house_number': '2',
+                'postal_code': '3900',
+            })
+
+        self.assertEquals(response.status_code, 200)
+
+        addresses = json.loads(response.content.decode('utf-8'))['addresses']
+
+        self.assertEquals(
+            [(a['objectID'], a['floor'], a['locality_name'])
+             for a in addresses],
+            [(str(self.addresses[1].objectID), '3', 'Nuuk')],
+        )
+
+        for params in [{}, {'road': 'Aqqusinersuaq', 'colour': 'red'},
+                       {'postal_code': 'Nuuk'}]:
+            response = self.client.get('/lookup/address', params)
+
+            self.assertEquals(response.status_code, 400, params)
+
+    def test_lookup_batch(self):
+        lookups = [
+            {'road': 'Aqqusinersuaq', 'house_number': '1'},
+            {'road': 'Aqqusinersuaq', 'house_number': '1', 'floor': '3'},
+            {'road': 'Aqqusinersuaq', 'locality': 'Nuuk'},
+            {'road': 'Vejen', 'house_number': '1'},
+        ] * 1000
+
+        # a batch takes one query for every 500 distinct roads
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/lookup/address',
+                json.dumps({'addresses': lookups}),
+                content_type='application/json',
+            )
+
+        self.assertEquals(response.status_code, 200)
+
+        results = json.loads(response.content.decode('utf-8'))['results']
+
+        self.assertEquals(len(results), len(lookups))
+        self.assertEquals(
+            [[a['house_number'] for a in matches] for matches in results[:4]],
+            [['1'], [], ['1', '2'], []],
+        )
+
+        # single lookups and batches agree, including on missing parts
+        # and on case
+        for criteria in [
+            {'road': 'Aqqusinersuaq', 'floor': None},
+            {'road': 'Aqqusinersuaq', 'floor': '3'},
+            {'road': 'AQQUSINERSUAQ'},
+            {'road': 'Aqqusinersuaq', 'locality': 'nuuk'},
+        ]:
+            self.assertEquals(lookup.find(criteria),
+                              lookup.find_all([criteria])[0], criteria)
+
+        self.assertEquals(
+            [
+                a['house_number'] for a in lookup.find({
+                    'road': 'Aqqusinersuaq', 'floor': None,
+                })
+            ],
+            ['1'],
+        )
+
+        # a batch may mix lookups with and without a road
+        AddressResolution.objects.filter(
+            address=self.addresses[0],
+        ).update(road_name=None)
+
+        lookups = [{'road': None}, {'road': 'Aqqusinersuaq'}]
+
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/lookup/address',
+                json.dumps({'addresses': lookups}),
+                content_type='application/json',
+            )
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(
+            [
+                [a['house_number'] for a in matches]
+                for matches in json.loads(
+                    response.content.decode('utf-8'),
+                )['results']
+            ],
+            [['1'], ['2']],
+        )
+        self.assertEquals(lookup.find_all(lookups),
+                          [lookup.find(criteria) for criteria in lookups])
+        self.assertEquals(lookup.find_all(lookups[:1]),
+                          [lookup.find(lookups[0])])
+
+        for body in ['[]', '{"addresses": [{"house_number": "1"}]}',
+                     json.dumps({'addresses': [{'road': 'Vejen'}] * 10001})]:
+            response = self.client.post('/lookup/address', body,
+                                        content_type='application/json')
+
+            self.assertEquals(response.status_code, 400, body)
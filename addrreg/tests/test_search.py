@@ -0,0 +1,196 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import importlib
+import io
+
+from django import apps, db, test
+from django.core import management
+from django.conf import settings
+
+from .. import models
+from ..models import search
+from .util import DUMMY_DOMAIN
+
+
+class SearchTests(test.TestCase):
+
+    def setUp(self):
+        self.superuser = apps.apps.get_model(
+            settings.AUTH_USER_MODEL,
+        ).objects.create_superuser(
+            'root', 'root@example.com', 'password',
+        )
+
+        self.state = models.State.objects.create(
+            id=0,
+            state_id=0,
+            name='Good',
+            code=1,
+        )
+        self.mun = models.Municipality.objects.create(
+            name='Kommuneqarfik Sermersooq',
+            code=955,
+            abbrev='SQ',
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.locality = models.Locality.objects.create(
+            name='Nuuk',
+            code=600,
+            municipality=self.mun,
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        self.roads = [
+            models.Road.objects.create(
+                name=name,
+                code=code,
+                location=self.locality,
+                municipality=self.mun,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            for code, name in enumerate([
+                'Aqqusinersuaq', 'Ålevej', 'H.C. Ørstedsvej',
+            ], 1)
+        ]
+
+    def _get_terms(self, obj):
+        return set(search.SearchEntry.objects.filter(
+            model=obj.type_name(),
+            object_id=obj.pk,
+        ).values_list('term', flat=True))
+
+    def _search(self, model_name, q):
+        self.client.force_login(self.superuser)
+
+        response = self.client.get(
+            '/admin/addrreg/{}/'.format(model_name), {'q': q},
+        )
+
+        self.assertEquals(response.status_code, 200)
+
+        return sorted(obj.name for obj in response.context['cl'].result_list)
+
+    def test_normalise(self):
+        self.assertEquals(search.normalise('Ålevej'), 'alevej')
+        self.assertEquals(search.normalise('H.C. Ørstedsvej'),
+                          'h.c. orstedsvej')
+        self.assertEquals(search.normalise('Uummannaq Kangerluĸ'),
+                          'uummannaq kangerluq')
+
+        self.assertEquals(search.tokenise('H.C. Ørstedsvej'),
+                          ['h', 'c', 'orstedsvej'])
+        self.assertEquals(
+            search.get_terms(['Blok P', None]),
+            {'blok', 'lok', 'ok', 'p'},
+        )
+
+    def test_maintenance(self):
+        road = self.roads[1]
+
+        self.assertIn('alevej', self._get_terms(road))
+        self.assertIn('vej', self._get_terms(road))
+
+        road.name = 'Åkandevej'
+        road.save()
+
+        self.assertIn('akandevej', self._get_terms(road))
+        self.assertNotIn('alevej', self._get_terms(road))
+
+        road.cpr_name = 'Aakandevej'
+        models.Road.objects.bulk_save([road])
+
+        self.assertIn('aakandevej', self._get_terms(road))
+
+        road.delete()
+
+        self.assertEquals(self._get_terms(road), set())
+
+    def test_rebuild(self):
+        expected = sorted(
+            search.SearchEntry.objects.values_list(
+                'model', 'object_id', 'term',
+            )
+        )
+
+        search.SearchEntry.objects.all().delete()
+
+        stdout = io.StringIO()
+        management.call_command('rebuild_search_index', stdout=stdout)
+
+        self.assertEquals(stdout.getvalue().strip(),
+                          'Indexed {} terms.'.format(len(expected)))
+        self.assertEquals(
+            sorted(
+                search.SearchEntry.objects.values_list(
+                    'model', 'object_id', 'term',
+                )
+            ),
+            expected,
+        )
+
+    def test_migration(self):
+        expected = sorted(
+            search.SearchEntry.objects.values_list(
+                'model', 'object_id', 'term',
+            )
+        )
+
+        search.SearchEntry.objects.all().delete()
+
+        migration = importlib.import_module(
+            'addrreg.migrations.0008_search_entry',
+        )
+
+        with db.connection.schema_editor() as schema_editor:
+            migration.index_names(apps.apps, schema_editor)
+
+        self.assertEquals(
+            sorted(
+                search.SearchEntry.objects.values_list(
+                    'model', 'object_id', 'term',
+                )
+            ),
+            expected,
+        )
+
+    def test_admin_search(self):
+        self.assertEquals(self._search('road', 'alev'), ['Ålevej'])
+        self.assertEquals(self._search('road', 'ØRSTED'), ['H.C. Ørstedsvej'])
+        self.assertEquals(self._search('road', 'h.c. sted'),
+                          ['H.C. Ørstedsvej'])
+
+        # joined names, and several words
+        self.assertEquals(len(self._search('road', 'nuuk')), 3)
+        self.assertEquals(self._search('road', 'nuuk qusi'),
+                          ['Aqqusinersuaq'])
+        self.assertEquals(self._search('road', 'nuuk godthåb'), [])
+
+        # exact fields are searched as well, but only for sensible values
+        self.assertEquals(self._search('road', '2'), ['Ålevej'])
+        self.assertEquals(self._search('municipality', 'sermer'),
+                          ['Kommuneqarfik Sermersooq'])
+        self.assertEquals(self._search('municipality', '955'),
+                          ['Kommuneqarfik Sermersooq'])
+
+    def test_autocomplete(self):
+        self.client.force_login(self.superuser)
+
+        response = self.client.get(
+            '/admin/addrreg/address/foreignkey_autocomplete/',
+            {
+                'q': 'qarfik',
+                'app_label': 'addrreg',
+                'model_name': 'municipality',
+                'search_fields': 'name,=code',
+            },
+        )
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(
+            response.content.decode('utf-8'),
+            'Kommuneqarfik Sermersooq|{}\n'.format(self.mun.pk),
+        )
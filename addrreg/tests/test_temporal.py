@@ -3,14 +3,17 @@
 from __future__ import absolute_import, unicode_literals, print_function
 
 import datetime
+import io
+import json
 
 import freezegun
 import pytz
 
-from django import test
-from django.core import exceptions
+from django import db, test
+from django.contrib.auth import models as auth_models
+from django.core import exceptions, management, serializers
 
-from .. import models
+from .. import models, util
 from .util import DUMMY_DOMAIN
 
 
@@ -233,3 +236,322 @@ class TemporalTests(test.TransactionTestCase):
                 'registration_to': None
             },
         ])
+
+    def test_bulk_save(self):
+        state = self.state
+
+        with freezegun.freeze_time('2001-01-01'):
+            muns = models.Municipality.objects.bulk_save([
+                models.Municipality(name='Aarhus', code=20, state=state,
+                                    sumiffiik_domain=DUMMY_DOMAIN),
+                models.Municipality(name='Odense', code=30, state=state,
+                                    sumiffiik_domain=DUMMY_DOMAIN),
+            ])
+
+        self.assertEquals(models.Municipality.objects.count(), 2)
+        self.assertEquals(
+            self._getregistrations(),
+            [
+                {
+                    'object': mun.id,
+                    'objectID': mun.objectID,
+                    'registration_from': datetime.datetime(2001, 1, 1, 0, 0,
+                                                           tzinfo=pytz.UTC),
+                    'registration_to': None,
+                }
+                for mun in muns
+            ]
+        )
+
+        with freezegun.freeze_time('2001-01-02'):
+            for mun in muns:
+                mun.note = 'Dette er en note.'
+                mun.name += 'kommune'
+
+            models.Municipality.objects.bulk_save(muns)
+
+        self.assertEquals(
+            set(models.Municipality.objects.values_list('note', flat=True)),
+            {'Dette er en note.'},
+        )
+        self.assertEquals(
+            list(models.Municipality.objects.values_list('name', flat=True)),
+            ['Aarhuskommune', 'Odensekommune'],
+        )
+        self.assertEquals(
+            list(models.Municipality.Registrations.objects.order_by(
+                'registration_from', 'name',
+            ).values_list('name', flat=True)),
+            ['Aarhus', 'Odense', 'Aarhuskommune', 'Odensekommune'],
+        )
+        self.assertEquals(
+            [
+                (r['objectID'], r['registration_from'].day,
+                 r['registration_to'] and r['registration_to'].day)
+                for r in self._getregistrations()
+            ],
+            [
+                (muns[0].objectID, 1, 2),
+                (muns[1].objectID, 1, 2),
+                (muns[0].objectID, 2, None),
+                (muns[1].objectID, 2, None),
+            ]
+        )
+
+        checksums = set(
+            models.Municipality.Registrations.objects.values_list(
+                'checksum', flat=True,
+            )
+        )
+
+        self.assertNotIn(None, checksums)
+        self.assertEquals(
+            set(models.events.Event.objects.filter(
+                updated_type='municipality',
+            ).values_list(
+                'updated_registration', flat=True,
+            )),
+            checksums,
+        )
+
+        with freezegun.freeze_time('2001-01-01'):
+            self.assertRaises(exceptions.ValidationError,
+                              models.Municipality.objects.bulk_save, muns)
+
+    def test_bulk_save_queries(self):
+        state = self.state
+
+        def count_queries(n):
+            muns = [
+                models.Municipality(name='Aarhus', code=i, state=state,
+                                    sumiffiik_domain=DUMMY_DOMAIN)
+                for i in range(n)
+            ]
+
+            with test.utils.CaptureQueriesContext(
+                    db.connection) as ctx:
+                models.Municipality.objects.bulk_save(muns)
+
+                for mun in muns:
+                    mun.note = 'Dette er en note.'
+
+                models.Municipality.objects.bulk_save(muns)
+
+            return len(ctx.captured_queries)
+
+        self.assertEquals(count_queries(10), count_queries(30))
+
+    def test_checksums(self):
+        with freezegun.freeze_time('2001-01-01'):
+            mun = models.Municipality.objects.create(
+                name='Aarhus',
+                code=20,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+
+        registrations = models.Municipality.Registrations.objects.all()
+        checksum = registrations.get().checksum
+
+        self.assertIsNotNone(checksum)
+
+        # formatting never writes
+        with self.assertNumQueries(1):
+            mun.format()
+
+        registrations.update(checksum=None)
+
+        management.call_command('backfill_checksums', processes=1,
+                                stdout=io.StringIO())
+
+        self.assertEquals(registrations.get().checksum, checksum)
+
+        # and again, using several worker processes
+        state_registrations = models.State.Registrations.objects.all()
+        state_checksum = state_registrations.get().checksum
+
+        registrations.update(checksum=None)
+        state_registrations.update(checksum=None)
+
+        stdout = io.StringIO()
+        management.call_command('backfill_checksums', processes=2,
+                                chunk_size=1, stdout=stdout)
+
+        self.assertEquals(stdout.getvalue().strip(),
+                          'Calculated 2 checksums.')
+        self.assertEquals(registrations.get().checksum, checksum)
+        self.assertEquals(state_registrations.get().checksum, state_checksum)
+
+    def test_fields(self):
+        user = auth_models.User.objects.create(username='hans')
+
+        mun = models.Municipality(
+            name='Aarhus',
+            code=20,
+            abbrev='AAR',
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        district = models.District(
+            name='Midtbyen',
+            code=1,
+            abbrev='MB',
+            state=self.state,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        pc = models.PostalCode(
+            state=self.state,
+            code=8000,
+            name='Aarhus C',
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+
+        for obj in (mun, district, pc):
+            obj._registration_user = user
+            obj.save()
+
+        locality = models.Locality(
+            state=self.state,
+            name='Somewhere',
+            code=42,
+            type=models.LocalityType.TOWN,
+            municipality=mun,
+            district=district,
+            postal_code=pc,
+            sumiffiik_domain=DUMMY_DOMAIN,
+            valid_from=datetime.datetime(2001, 1, 1, tzinfo=pytz.utc),
+        )
+        locality.save()
+
+        road = models.Road(
+            municipality=mun,
+            location=locality,
+            state=self.state,
+            code=1337,
+            name='Hans Hartvig Seedorffs Stræde',
+            shortname='H H Seedorffs Stræde',
+            sumiffiik_domain=DUMMY_DOMAIN,
+            note='Bemærk',
+        )
+        road.save()
+
+        b = models.BNumber(
+            municipality=mun,
+            location=locality,
+            state=self.state,
+            code='42',
+            b_callname='The Block',
+            b_type='BS221B',
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        b.save()
+
+        addr = models.Address(
+            municipality=mun,
+            state=self.state,
+            house_number='42Z',
+            b_number=b,
+            road=road,
+            sumiffiik_domain=DUMMY_DOMAIN,
+        )
+        addr.save()
+
+        # the fast path must yield exactly what the serializer does
+        for cls in models.ALL_OBJECT_CLASSES.values():
+            registrations = list(cls.Registrations.objects.all())
+
+            self.assertTrue(registrations, cls)
+
+            for registration in registrations:
+                expected, = serializers.serialize('python_with_identity',
+                                                  [registration])
+
+                self.assertEquals(
+                    json.dumps(registration.fields, sort_keys=True,
+                               default=util.json_serialize_object),
+                    json.dumps(dict(expected['fields']), sort_keys=True,
+                               default=util.json_serialize_object),
+                )
+
+                checksum = registration.checksum
+                registration.checksum = None
+                registration.calculate_checksum(save=False)
+
+                self.assertEquals(registration.checksum, checksum)
+
+        # none of the referenced objects are loaded
+        registration = models.Address.Registrations.objects.get()
+
+        with self.assertNumQueries(0):
+            registration.format()
+
+        with self.assertNumQueries(1):
+            models.Address.Registrations.objects.by_checksum(
+                [registration.checksum],
+            )[registration.checksum].format()
+
+    def test_as_of(self):
+        def at(day):
+            return datetime.datetime(2001, 1, day, tzinfo=pytz.utc)
+
+        with freezegun.freeze_time(at(2)):
+            mun = models.Municipality.objects.create(
+                name='Aarhus',
+                code=20,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            locality = models.Locality.objects.create(
+                state=self.state,
+                name='Somewhere',
+                code=42,
+                municipality=mun,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+            road = models.Road.objects.create(
+                municipality=mun,
+                location=locality,
+                state=self.state,
+                code=1337,
+                name='Gaden',
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+
+        with freezegun.freeze_time(at(4)):
+            mun.name = 'Aarhus Kommune'
+            mun.save()
+
+        with freezegun.freeze_time(at(6)):
+            road.name = 'Vejen'
+            road.save()
+
+        with freezegun.freeze_time(at(8)):
+            road.delete()
+
+        def get_names(day):
+            return [
+                (r.name, r.municipality_as_of.name, r.location_as_of.name)
+                for r in models.Road.objects.as_of(at(day)).resolve()
+            ]
+
+        self.assertEquals(get_names(1), [])
+        self.assertEquals(get_names(2), [('Gaden', 'Aarhus', 'Somewhere')])
+        self.assertEquals(get_names(3), [('Gaden', 'Aarhus', 'Somewhere')])
+        self.assertEquals(get_names(4),
+                          [('Gaden', 'Aarhus Kommune', 'Somewhere')])
+        self.assertEquals(get_names(7),
+                          [('Vejen', 'Aarhus Kommune', 'Somewhere')])
+        self.assertEquals(get_names(9), [])
+
+        # one query for the roads, and one for each field
+        with self.assertNumQueries(2):
+            registration, = models.Road.objects.as_of(at(5)).filter(
+                code=1337,
+            ).resolve('municipality')
+
+        self.assertEquals(registration.municipality_as_of.name,
+                          'Aarhus Kommune')
+        self.assertFalse(hasattr(registration, 'location_as_of'))
+
+        with self.assertRaises(TypeError):
+            models.Road.Registrations.objects.resolve()
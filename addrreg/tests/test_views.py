@@ -0,0 +1,568 @@
+# -*- mode: python; coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals, print_function
+
+import datetime
+import gzip
+import importlib
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+import freezegun
+
+from django import db, test
+from django.core import management
+from django.test import utils
+from django.utils import timezone
+
+from .. import metrics, models, snapshot, util
+from .util import DUMMY_DOMAIN
+
+
+class ViewTests(test.TransactionTestCase):
+    reset_sequences = True
+
+    def setUp(self):
+        self.state = models.State.objects.create(
+            id=0,
+            state_id=0,
+            name='Good',
+            code=1,
+        )
+
+        with freezegun.freeze_time('2001-01-01'):
+            self.muns = [
+                models.Municipality.objects.create(
+                    name=name,
+                    code=code,
+                    state=self.state,
+                    sumiffiik_domain=DUMMY_DOMAIN,
+                )
+                for code, name in [(20, 'Aarhus'), (30, 'Odense')]
+            ]
+
+        with freezegun.freeze_time('2001-01-02'):
+            self.muns[0].note = 'Dette er en note.'
+            self.muns[0].save()
+
+    @staticmethod
+    def _get_checksums(mun):
+        return list(
+            mun.registrations.order_by('registration_from').values_list(
+                'checksum', flat=True,
+            )
+        )
+
+    def _get_json(self, path, **kwargs):
+        response = self.client.get(path, kwargs)
+
+        self.assertEquals(response.status_code, 200)
+
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+
+        return json.loads(content.decode('utf-8'))
+
+    def test_list_checksums(self):
+        self.assertEquals(
+            self._get_json('/listChecksums', objectType='municipality'),
+            {
+                'items': [
+                    {
+                        'type': 'municipality',
+                        'objectID': str(mun.objectID),
+                        'registreringer': [
+                            {
+                                'sekvensNummer': i,
+                                'checksum': checksum,
+                            }
+                            for i, checksum in enumerate(
+                                self._get_checksums(mun)
+                            )
+                        ],
+                    }
+                    for mun in self.muns
+                ],
+            },
+        )
+
+        # states aren't listed
+        self.assertEquals(
+            len(self._get_json('/listChecksums')['items']),
+            2,
+        )
+
+    def test_list_checksums_since(self):
+        with self.assertNumQueries(1):
+            items = self._get_json('/listChecksums',
+                                   objectType='municipality',
+                                   timestamp='2001-01-01T12:00:00')['items']
+
+        self.assertEquals(items, [
+            {
+                'type': 'municipality',
+                'objectID': str(self.muns[0].objectID),
+                'registreringer': [
+                    {
+                        'sekvensNummer': 0,
+                        'checksum': self._get_checksums(self.muns[0])[1],
+                    },
+                ],
+            },
+        ])
+
+    def test_get_registrations(self):
+        registrations = {
+            registration.checksum: registration
+            for registration in models.Municipality.Registrations.objects.all()
+        }
+        checksums = sorted(registrations) + ['0' * 64]
+
+        with self.assertNumQueries(1):
+            result = self._get_json('/get/municipality/' + ';'.join(checksums))
+
+        self.assertEquals(
+            result,
+            {
+                checksum: json.loads(
+                    util.dump_json(registration.format()),
+                )
+                for checksum, registration in registrations.items()
+            },
+        )
+
+    def test_get_new_events(self):
+        expected = list(
+            models.events.Event.objects.order_by('created', 'pk').values_list(
+                'eventID', flat=True,
+            )
+        )
+
+        self.assertEquals(len(expected), 4)
+
+        received = []
+        cursor = ''
+
+        while cursor is not None:
+            with self.assertNumQueries(1):
+                page = self._get_json('/getNewEvents', limit=3,
+                                      cursor=cursor)
+
+            self.assertLessEqual(len(page['events']), 3)
+
+            received += [event['eventID'] for event in page['events']]
+            cursor = page['next']
+
+        self.assertEquals(received, [str(e) for e in expected])
+
+        event = models.events.Event.objects.get(eventID=expected[0])
+        event.receipt()
+
+        result = self._get_json('/getNewEvents')
+
+        self.assertIsNone(result['next'])
+        self.assertEquals(
+            [event['eventID'] for event in result['events']],
+            [str(e) for e in expected[1:]],
+        )
+        self.assertEquals(
+            {
+                event['eventID']:
+                event['beskedData']['Objektreference']['objektreference']
+                for event in result['events']
+            },
+            {
+                str(event.eventID):
+                'http://localhost:8000/get/{}/{}'.format(
+                    event.updated_type, event.updated_registration,
+                )
+                for event in models.events.Event.objects.filter(
+                    receipt_obtained__isnull=True,
+                )
+            },
+        )
+
+    def test_get_new_events_pages(self):
+        # several events sharing their creation time, spread over pages
+        with freezegun.freeze_time('2001-01-03'):
+            for code in range(40, 44):
+                models.Municipality.objects.create(
+                    name='Kommune {}'.format(code),
+                    code=code,
+                    state=self.state,
+                    sumiffiik_domain=DUMMY_DOMAIN,
+                )
+
+        expected = [
+            str(event_id)
+            for event_id in models.events.Event.objects.order_by(
+                'created', 'pk',
+            ).values_list('eventID', flat=True)
+        ]
+
+        self.assertEquals(len(expected), 8)
+
+        received = []
+        cursor = ''
+        pages = 0
+
+        while cursor is not None:
+            with utils.CaptureQueriesContext(db.connection) as ctx:
+                page = self._get_json('/getNewEvents', limit=3,
+                                      cursor=cursor)
+
+            if cursor:
+                # later pages start the scan at the cursor
+                self.assertIn('"created" >= ', ctx.captured_queries[0]['sql'])
+
+            received += [event['eventID'] for event in page['events']]
+            cursor = page['next']
+            pages += 1
+
+        self.assertEquals(pages, 3)
+        self.assertEquals(received, expected)
+
+    def test_unreceipted_index(self):
+        migration = importlib.import_module(
+            'addrreg.migrations.0003_event_unreceipted_index',
+        )
+
+        statements = {}
+
+        for vendor in ('sqlite', 'mysql'):
+            schema_editor = mock.Mock(
+                connection=mock.Mock(vendor=vendor),
+                quote_name='"{}"'.format,
+            )
+
+            migration.create_index(None, schema_editor)
+            migration.drop_index(None, schema_editor)
+
+            statements[vendor] = [
+                call[0][0] for call in schema_editor.execute.call_args_list
+            ]
+
+        self.assertEquals(statements, {
+            'sqlite': [
+                'CREATE INDEX "addrreg_event_unreceipted" ON "addrreg_event" '
+                '("created", "id") WHERE "receipt_obtained" IS NULL',
+                'DROP INDEX "addrreg_event_unreceipted"',
+            ],
+            'mysql': [
+                'CREATE INDEX "addrreg_event_unreceipted" ON "addrreg_event" '
+                '("receipt_obtained", "created", "id")',
+                'DROP INDEX "addrreg_event_unreceipted" ON "addrreg_event"',
+            ],
+        })
+
+    def _read_snapshot(self, content):
+        header, *lines = gzip.decompress(content).decode('utf-8').splitlines()
+
+        return json.loads(header), sorted(lines)
+
+    def _write_snapshot(self, **kwargs):
+        management.call_command('snapshot', 'municipality',
+                                stdout=io.StringIO(), **kwargs)
+
+        with open(snapshot.get_path('municipality'), 'rb') as fp:
+            return self._read_snapshot(fp.read())
+
+    def test_snapshot(self):
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+
+        with self.settings(SNAPSHOT_DIR=snapshot_dir), \
+                freezegun.freeze_time('2001-02-01'):
+            header, lines = self._write_snapshot()
+
+        self.assertEquals(header, {
+            'type': 'municipality',
+            'generated': '2001-02-01T00:00:00Z',
+            'sequence': models.events.Event.objects.latest('pk').sequence,
+        })
+        self.assertEquals(lines, sorted(
+            util.dump_json(registration.format())
+            for registration in models.Municipality.Registrations.objects
+            .filter(registration_to=None)
+        ))
+
+        with freezegun.freeze_time('2001-03-01'):
+            self.muns[0].delete()
+
+            models.Municipality.objects.create(
+                name='København',
+                code=40,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+
+        # a transaction committing long after its timestamps
+        with freezegun.freeze_time('2001-01-15'):
+            models.Municipality.objects.create(
+                name='Roskilde',
+                code=50,
+                state=self.state,
+                sumiffiik_domain=DUMMY_DOMAIN,
+            )
+
+        with self.settings(SNAPSHOT_DIR=snapshot_dir), \
+                freezegun.freeze_time('2001-03-02'):
+            header, incremental = self._write_snapshot()
+            header, full = self._write_snapshot(full=True)
+
+        # the other municipality was copied from the previous snapshot
+        self.assertEquals(len(full), 3)
+        self.assertEquals(
+            [line for line in lines if str(self.muns[1].objectID) in line],
+            [line for line in full if str(self.muns[1].objectID) in line],
+        )
+        self.assertEquals(incremental, full)
+
+    def test_snapshot_view(self):
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+
+        with self.settings(SNAPSHOT_DIR=snapshot_dir):
+            self.assertEquals(
+                self.client.get('/snapshot/municipality').status_code,
+                404,
+            )
+
+            self._write_snapshot()
+
+            with open(snapshot.get_path('municipality'), 'rb') as fp:
+                content = fp.read()
+
+            def get(**headers):
+                response = self.client.get('/snapshot/municipality',
+                                           **headers)
+
+                return response, b''.join(response.streaming_content)
+
+            response, body = get()
+            etag = response['ETag']
+
+            self.assertEquals(response.status_code, 200)
+            self.assertEquals(body, content)
+            self.assertEquals(response['Content-Length'], str(len(content)))
+            self.assertEquals(response['Accept-Ranges'], 'bytes')
+
+            self.assertEquals(
+                self.client.get('/snapshot/municipality',
+                                HTTP_IF_NONE_MATCH=etag).status_code,
+                304,
+            )
+
+            # resume a download
+            response, body = get(HTTP_RANGE='bytes=100-', HTTP_IF_RANGE=etag)
+
+            self.assertEquals(response.status_code, 206)
+            self.assertEquals(body, content[100:])
+            self.assertEquals(
+                response['Content-Range'],
+                'bytes 100-{}/{}'.format(len(content) - 1, len(content)),
+            )
+
+            response, body = get(HTTP_RANGE='bytes=-10')
+
+            self.assertEquals(response.status_code, 206)
+            self.assertEquals(body, content[-10:])
+
+            response, body = get(HTTP_RANGE='bytes=10-19')
+
+            self.assertEquals(response.status_code, 206)
+            self.assertEquals(body, content[10:20])
+
+            # malformed ranges are ignored
+            response, body = get(HTTP_RANGE='bytes=20-10')
+
+            self.assertEquals(response.status_code, 200)
+            self.assertEquals(body, content)
+
+            # ...unless the snapshot changed in the meantime
+            response, body = get(HTTP_RANGE='bytes=100-',
+                                 HTTP_IF_RANGE='"outdated"')
+
+            self.assertEquals(response.status_code, 200)
+            self.assertEquals(body, content)
+
+            response = self.client.get(
+                '/snapshot/municipality',
+                HTTP_RANGE='bytes={}-'.format(len(content)),
+            )
+
+            self.assertEquals(response.status_code, 416)
+
+            self.assertEquals(self.client.get('/snapshot/nothing').status_code,
+                              404)
+
+    def test_changes(self):
+        expected = list(
+            models.events.Event.objects.order_by('pk').values_list(
+                'sequence', 'updated_type', 'updated_registration',
+            )
+        )
+
+        # the state, the two municipalities and an update
+        self.assertEquals([e[0] for e in expected], [1, 2, 3, 4])
+
+        received = []
+        since = 0
+        more = True
+
+        while more:
+            page = self._get_json('/changes', since=since, limit=3)
+
+            received += page['changes']
+            since, more = page['next'], page['more']
+
+        self.assertEquals(since, 4)
+        self.assertEquals(
+            [
+                (change['sequence'], change['type'], change['checksum'])
+                for change in received
+            ],
+            expected,
+        )
+
+        registration = models.Municipality.Registrations.objects.get(
+            checksum=received[-1]['checksum'],
+        )
+
+        self.assertEquals(
+            received[-1]['registration'],
+            json.loads(util.dump_json(registration.format())),
+        )
+
+        # polling is cheap, and returns nothing new
+        with self.assertNumQueries(1):
+            page = self._get_json('/changes', since=since)
+
+        self.assertEquals(page, {'changes': [], 'next': 4, 'more': False})
+
+        with freezegun.freeze_time('2001-01-03'):
+            for mun in self.muns:
+                mun.note = 'Endnu en note.'
+
+            models.Municipality.objects.bulk_save(self.muns)
+
+        # one query for the events, and one for each type
+        with self.assertNumQueries(2):
+            page = self._get_json('/changes', since=since)
+
+        self.assertEquals(
+            [
+                (change['sequence'], change['objectID'])
+                for change in page['changes']
+            ],
+            [(5, str(self.muns[0].objectID)), (6, str(self.muns[1].objectID))],
+        )
+
+        self.assertEquals(
+            self.client.get('/changes', {'since': 'x'}).status_code,
+            400,
+        )
+
+    def test_changes_missing_registration(self):
+        latest = models.events.Event.objects.latest('sequence')
+
+        models.Municipality.Registrations.objects.filter(
+            checksum=latest.updated_registration,
+        ).delete()
+
+        page = self._get_json('/changes')
+
+        # the change remains, but without its registration
+        self.assertEquals(len(page['changes']), 4)
+        self.assertEquals(page['changes'][-1]['sequence'], latest.sequence)
+        self.assertIsNone(page['changes'][-1]['registration'])
+        self.assertIsNotNone(page['changes'][-2]['registration'])
+
+    def test_database_check(self):
+        # a constant query, and one on the index of unreceipted events
+        with freezegun.freeze_time('2001-01-11'):
+            with self.assertNumQueries(2):
+                result = self._get_json('/monitor/database')
+
+        self.assertEquals(result['status'], 'ok')
+        self.assertGreaterEqual(result['latency_ms'], 0)
+        self.assertEquals(result['oldest_unreceipted_age'], 10 * 24 * 3600)
+        self.assertTrue(result['connections']['default']['connected'])
+
+        for event in models.events.Event.objects.all():
+            event.receipt()
+
+        self.assertIsNone(
+            self._get_json('/monitor/database')['oldest_unreceipted_age'],
+        )
+
+        with mock.patch('django.db.backends.utils.CursorWrapper.execute',
+                        side_effect=db.OperationalError('gone')):
+            response = self.client.get('/monitor/database')
+
+        self.assertEquals(response.status_code, 503)
+        self.assertEquals(
+            json.loads(response.content.decode('utf-8'))['status'],
+            'unavailable',
+        )
+
+    def test_metrics(self):
+        metrics._cache = None
+
+        first, second, third = models.events.Event.objects.filter(
+            updated_type='municipality',
+        ).order_by('sequence')
+
+        with freezegun.freeze_time('2001-01-01 00:00:03'):
+            first.receipt()
+
+        # a full save keeps the creation time
+        with freezegun.freeze_time('2001-01-01 00:10:00'):
+            second.receipt_obtained = timezone.now()
+            second.receipt_errorcode = 'nope'
+            second.save()
+
+        models.events.Event.objects.filter(pk=first.pk).update(
+            pushed=first.created + datetime.timedelta(seconds=2),
+            push_attempts=2,
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/monitor/metrics')
+
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Content-Type'], metrics.CONTENT_TYPE)
+
+        lines = response.content.decode('utf-8').splitlines()
+
+        for line in [
+            'addrreg_events{state="pending",type="municipality"} 1',
+            'addrreg_events{state="receipted",type="municipality"} 1',
+            'addrreg_events{state="failed",type="municipality"} 1',
+            'addrreg_events{state="pending",type="state"} 1',
+            'addrreg_event_push_attempts_total{type="municipality"} 2',
+            'addrreg_event_receipt_lag_seconds_bucket'
+            '{le="1",type="municipality"} 0',
+            'addrreg_event_receipt_lag_seconds_bucket'
+            '{le="5",type="municipality"} 1',
+            'addrreg_event_receipt_lag_seconds_bucket'
+            '{le="900",type="municipality"} 2',
+            'addrreg_event_receipt_lag_seconds_bucket'
+            '{le="+Inf",type="municipality"} 2',
+            'addrreg_event_receipt_lag_seconds_sum{type="municipality"} 603.0',
+            'addrreg_event_receipt_lag_seconds_count{type="municipality"} 2',
+            'addrreg_event_push_latency_seconds_bucket'
+            '{le="5",type="municipality"} 1',
+            'addrreg_event_push_latency_seconds_sum{type="municipality"} 2.0',
+            'addrreg_event_push_latency_seconds_count{type="state"} 0',
+        ]:
+            self.assertIn(line, lines)
+
+        # scrapes are served from the cache for a while
+        with self.assertNumQueries(0):
+            self.client.get('/monitor/metrics')
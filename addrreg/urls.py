@@ -35,10 +35,15 @@ urlpatterns = [
     url(r'^getNewEvents/?$', views.GetNewEventsView.as_view()),
     url(r"^receipt/(?P<eventID>%s)?$" % uuidpattern, views.Receipt.as_view()),
     url(r'^listChecksums/?$', views.ListChecksumView.as_view()),
+    url(r'^changes/?$', views.ChangesView.as_view(), name='changes'),
     url(r'^get/(?P<type>[a-z]+)/(?P<checksums>[0-9a-f;]+)$',
         views.GetRegistrationsView.as_view(), name='getRegistrations'),
+    url(r'^lookup/address/?$', views.LookupView.as_view(), name='lookup'),
+    url(r'^snapshot/(?P<type>[a-z]+)$', views.SnapshotView.as_view(),
+        name='snapshot'),
 
     # MONITORING HANDLES
     url(r'^monitor/database/?$', views.DatabaseCheckView.as_view()),
+    url(r'^monitor/metrics/?$', views.MetricsView.as_view(), name='metrics'),
 
 ]
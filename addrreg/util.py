@@ -1,8 +1,11 @@
 import logging
+import math
 
 from datetime import datetime
+from urllib import parse
 
 from django.core import urlresolvers
+from django.db import connections, models
 from django.template import loader
 from django.utils.translation import ugettext_lazy as _
 from jsonview.decorators import _dump_json
@@ -22,18 +25,100 @@ def dump_json(data):
     return _dump_json(data)
 
 
-def render_list(items):
+# the amount of related objects shown in the change forms
+RENDER_LIST_LIMIT = 100
+
+
+def render_list(queryset, filters):
+    '''Render links to the objects of the given queryset matching the
+    given changelist filters, such as ``{'district__id__exact': 1}``.
+
+    At most ``RENDER_LIST_LIMIT`` objects are shown, in the order of the
+    model and then of their primary keys, followed by a link to the
+    changelist of all of them, if there are more.
+
+    '''
+    model = queryset.model
+    opts = model._meta
+
     try:
+        items = list(
+            queryset.filter(**filters).select_related(
+                *model.get_str_select_related()
+            ).order_by(*opts.ordering, 'pk')[:RENDER_LIST_LIMIT + 1]
+        )
+
+        # reverse the URL of a single object, and substitute the rest
+        marker = '__pk__'
+        prefix, suffix = urlresolvers.reverse(
+            'admin:{}_{}_change'.format(opts.app_label, opts.model_name),
+            args=(marker,),
+        ).split(marker)
+
+        if len(items) > RENDER_LIST_LIMIT:
+            more = '{}?{}'.format(
+                urlresolvers.reverse('admin:{}_{}_changelist'.format(
+                    opts.app_label, opts.model_name,
+                )),
+                parse.urlencode(sorted(filters.items())),
+            )
+        else:
+            more = None
+
         return loader.render_to_string('item_list.html', {
-            'items': {
-                item: urlresolvers.reverse(
-                    ("admin:%s_%s_change" % (item._meta.app_label,
-                                             item._meta.model_name)),
-                    args=(item.id,)
-                )
-                for item in items
-            }
+            'items': [
+                (item, '{}{}{}'.format(prefix, item.pk, suffix))
+                for item in items[:RENDER_LIST_LIMIT]
+            ],
+            'more': more,
         })
     except Exception:
         logger.exception('List rendering failed')
         return _('Error')
+
+
+def bulk_update(queryset, objs, fields):
+    '''Write the given fields of many objects using as few UPDATE
+    statements as the database allows, i.e. one per batch, each
+    selecting the new value by primary key with a CASE expression.
+
+    '''
+    objs = [obj for obj in objs if obj.pk is not None]
+
+    if not objs or not fields:
+        return
+
+    fields = [queryset.model._meta.get_field(name) for name in fields]
+    connection = connections[queryset.db]
+    # each object contributes its key to the WHERE clause, and a
+    # key and a value for each field to the CASE expressions
+    batch_size = max(
+        connection.ops.bulk_batch_size(['pk'] + fields * 2, objs), 1,
+    )
+
+    for start in range(0, len(objs), batch_size):
+        batch = objs[start:start + batch_size]
+
+        queryset.filter(pk__in=[obj.pk for obj in batch]).update(**{
+            field.attname: models.Case(
+                *[
+                    models.When(pk=obj.pk, then=models.Value(
+                        getattr(obj, field.attname), output_field=field,
+                    ))
+                    for obj in batch
+                ],
+                output_field=field
+            )
+            for field in fields
+        })
+
+
+def percentile(values, percent):
+    '''Return the given percentile of the sorted sequence ``values``,
+    using the nearest-rank method, or ``None`` if it is empty.'''
+    if not values:
+        return None
+
+    rank = max(math.ceil(len(values) * percent / 100), 1)
+
+    return values[rank - 1]
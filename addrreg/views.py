@@ -2,20 +2,32 @@ from __future__ import absolute_import, unicode_literals, print_function
 
 from django.contrib import admin
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, \
+    HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import render, render_to_response
 from django.urls import reverse
 from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag
+from django.utils import timezone
 from django.utils.translation import ugettext as _
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from jsonview.decorators import json_view
+from jsonview.exceptions import BadRequest
 from dateutil import parser as dateparser
-import pytz
+import collections
+import datetime
+import itertools
 import json
+import operator
+import os
+import pytz
+import time
 
 from .models import *
-from . import forms
+from . import connections, forms, lookup, metrics, snapshot, util
 
 
 class JsonView(View):
@@ -26,30 +38,91 @@ class JsonView(View):
 
 
 class GetNewEventsView(JsonView):
+    '''
+    List the events not yet receipted, oldest first, one page at a
+    time. Each page refers to the next using a cursor on the creation
+    time and ID of its last event, so that fetching a page is a range
+    scan of the index on unreceipted events, regardless of its
+    position.
+
+    Events created by transactions committing out of order may appear
+    behind the cursor; since they remain unreceipted, they will be
+    listed once the client starts over.
+    '''
+
+    default_limit = 1000
+    max_limit = 10000
+
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
+
+    @classmethod
+    def encode_cursor(cls, event):
+        return '{}-{}'.format(
+            (event.created - cls.epoch) // datetime.timedelta(microseconds=1),
+            event.pk,
+        )
+
+    @classmethod
+    def decode_cursor(cls, cursor):
+        try:
+            microseconds, pk = map(int, cursor.split('-'))
+        except ValueError:
+            raise BadRequest('invalid cursor')
+
+        return (cls.epoch + datetime.timedelta(microseconds=microseconds),
+                pk)
 
     @staticmethod
-    def format(event):
+    def format(event, prefix):
         return {
             'eventID': event.eventID,
             'beskedVersion': 1,
             'beskedData': {
                 'Objektreference': {
-                    'objektreference': "http://localhost:8000" + reverse(
-                        'getRegistrations', args=[
-                            event.updated_type.lower(),
-                            event.updated_registration,
-                        ]
-                    )
+                    'objektreference': "http://localhost:8000" + prefix +
+                    event.updated_type.lower() + '/' +
+                    event.updated_registration
                 }
             }
         }
 
     def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.GET.get('limit', self.default_limit))
+        except ValueError:
+            raise BadRequest('invalid limit')
+
+        limit = max(1, min(limit, self.max_limit))
+
         new_events = events.Event.objects.filter(
             receipt_obtained__isnull=True,
-        )
+        ).order_by('created', 'pk')
+
+        if request.GET.get('cursor'):
+            created, pk = self.decode_cursor(request.GET['cursor'])
+
+            # the plain lower bound lets the database use it as the
+            # start of the range scan, which it cannot do for the
+            # disjunction alone
+            new_events = new_events.filter(
+                Q(created__gt=created) | Q(created=created, pk__gt=pk),
+                created__gte=created,
+            )
+
+        new_events = list(new_events[:limit + 1])
+
+        # all links share a prefix, so only resolve it once
+        prefix = reverse('getRegistrations', args=['type', '0'])
+        prefix = prefix[:-len('type/0')]
+
         data = {
-            'events': [self.format(event) for event in new_events.all()]
+            'events': [
+                self.format(event, prefix) for event in new_events[:limit]
+            ],
+            'next': (
+                self.encode_cursor(new_events[limit - 1])
+                if len(new_events) > limit else None
+            ),
         }
         return data
 
@@ -72,20 +145,76 @@ class Receipt(View):
         return HttpResponse(status=201)
 
 
-class ListChecksumView(JsonView):
+class ListChecksumView(View):
+    '''
+    List the checksums of all registrations of each object, optionally
+    only those registered since a given time. Each object class takes
+    one query, and the response is streamed as it is read.
+    '''
 
     all_object_classes = [
         Municipality, District, PostalCode, Locality, BNumber, Road, Address
     ]
 
+    @staticmethod
+    def get_items(object_class, timestamp):
+        registrations = object_class.Registrations.objects.filter(
+            object__isnull=False,
+        )
+
+        if timestamp is not None:
+            registrations = registrations.filter(
+                registration_from__gte=timestamp,
+            )
+
+        rows = registrations.order_by(
+            'object_id', 'registration_from', 'pk',
+        ).values_list(
+            'object_id', 'objectID', 'checksum',
+        ).iterator()
+
+        for object_id, group in itertools.groupby(rows,
+                                                  operator.itemgetter(0)):
+            group = list(group)
+
+            yield {
+                'type': object_class.type_name(),
+                'objectID': group[0][1],
+                'registreringer': [
+                    {
+                        'sekvensNummer': index,
+                        'checksum': checksum,
+                    }
+                    for index, (object_id, objectID, checksum) in
+                    enumerate(group)
+                ]
+            }
+
+    @classmethod
+    def stream(cls, object_classes, timestamp):
+        separator = ''
+
+        yield '{"items": ['
+
+        for object_class in object_classes:
+            for item in cls.get_items(object_class, timestamp):
+                yield separator + util.dump_json(item)
+                separator = ', '
+
+        yield ']}'
+
     def get(self, request, *args, **kwargs):
 
         if 'timestamp' in request.GET:
             # Parse the timestamp parameter
-            timestamp = dateparser.parse(
-                request.GET.get('timestamp'),
-                dayfirst=True, yearfirst=False
-            )
+            try:
+                timestamp = dateparser.parse(
+                    request.GET.get('timestamp'),
+                    dayfirst=True, yearfirst=False
+                )
+            except (ValueError, OverflowError):
+                return HttpResponseBadRequest()
+
             # UTC if no zone is set
             if timestamp.tzinfo is None:
                 timestamp = pytz.utc.localize(timestamp)
@@ -103,17 +232,76 @@ class ListChecksumView(JsonView):
         else:
             object_classes = ListChecksumView.all_object_classes
 
-        # Get items
-        entities = []
-        for object_class in object_classes:
-            qs = object_class.objects
-            if timestamp is not None:
-                qs = qs.filter(registrations__registration_from__gte=timestamp)
+        return StreamingHttpResponse(
+            self.stream(object_classes, timestamp),
+            content_type='application/json',
+        )
+
+
+class ChangesView(JsonView):
+    '''
+    List the registrations created after the given event sequence
+    number, in the order their transactions committed, one page at a
+    time. Each page is a range scan of the index on the sequence
+    number, followed by one query for each type of registration on it.
+
+    Clients should pass the ``next`` value of each page as ``since`` to
+    the next request, and may poll with it once no more changes remain.
+    Changes whose registration no longer exists, e.g. as its object was
+    removed, have a null ``registration``.
+    '''
+
+    default_limit = 1000
+    max_limit = 10000
+
+    def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.GET.get('since', 0))
+            limit = int(request.GET.get('limit', self.default_limit))
+        except ValueError:
+            raise BadRequest('invalid since or limit')
+
+        limit = max(1, min(limit, self.max_limit))
+
+        changes = list(
+            events.Event.objects.filter(
+                sequence__gt=since,
+            ).order_by('sequence')[:limit + 1]
+        )
+        more = len(changes) > limit
+        changes = changes[:limit]
+
+        checksums = collections.defaultdict(set)
+
+        for event in changes:
+            checksums[event.updated_type].add(event.updated_registration)
+
+        registrations = {
+            type_name:
+            GetRegistrationsView.all_object_classes[type_name]
+            .Registrations.objects.by_checksum(type_checksums)
+            for type_name, type_checksums in checksums.items()
+        }
+
+        def format_change(event):
+            registration = registrations[event.updated_type].get(
+                event.updated_registration,
+            )
 
-            entities.extend(qs.all())
+            return {
+                'sequence': event.sequence,
+                'type': event.updated_type,
+                'objectID': event.objectID,
+                'checksum': event.updated_registration,
+                'registration':
+                registration.format() if registration is not None else None,
+            }
 
-        # Format output
-        return {'items': [entity.format(timestamp) for entity in entities]}
+        return {
+            'changes': [format_change(event) for event in changes],
+            'next': changes[-1].sequence if changes else since,
+            'more': more,
+        }
 
 
 class GetRegistrationsView(JsonView):
@@ -127,19 +315,181 @@ class GetRegistrationsView(JsonView):
     }
 
     def get(self, request, type, checksums, *args, **kwargs):
-        items = {}
         object_class = self.all_object_classes[type]
-        for checksum in checksums.split(';'):
-            registration = None
-            try:
-                registration = object_class.Registrations.objects.get(
-                    checksum=checksum
-                )
-                items[checksum] = registration.format()
-            except object_class.Registrations.DoesNotExist:
-                pass
+        checksums = checksums.split(';')
 
-        return items
+        registrations = object_class.Registrations.objects.by_checksum(
+            checksums,
+        )
+
+        return {
+            checksum: registrations[checksum].format()
+            for checksum in checksums
+            if checksum in registrations
+        }
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LookupView(JsonView):
+    '''
+    Look up current addresses by their road, house number, floor, room,
+    B-number, locality, postal code or municipality.
+
+    A GET request looks up a single address, given as query
+    parameters, e.g. ``?road=Aqqusinersuaq&house_number=1``. A POST
+    request looks up a batch, given as a JSON object with a list of
+    such lookups, each including a road, and returns the matches of
+    each in the same order.
+    '''
+
+    max_batch_size = 10000
+
+    def get(self, request, *args, **kwargs):
+        try:
+            return {
+                'addresses': lookup.find(request.GET.dict()),
+            }
+        except ValueError as exc:
+            raise BadRequest(str(exc))
+
+    def post(self, request, *args, **kwargs):
+        try:
+            lookups = json.loads(
+                request.body.decode(request.encoding or 'utf-8'),
+            )['addresses']
+        except (ValueError, KeyError, TypeError):
+            raise BadRequest('expected an object with a list of addresses')
+
+        if not isinstance(lookups, list) or \
+                not all(isinstance(item, dict) for item in lookups):
+            raise BadRequest('expected an object with a list of addresses')
+
+        if len(lookups) > self.max_batch_size:
+            raise BadRequest('at most {} addresses allowed'.format(
+                self.max_batch_size,
+            ))
+
+        try:
+            return {
+                'results': lookup.find_all(lookups),
+            }
+        except ValueError as exc:
+            raise BadRequest(str(exc))
+
+
+class SnapshotView(View):
+    '''
+    Serve the latest snapshot of a type, as written by the ``snapshot``
+    command. Clients may use the ETag to avoid downloading a snapshot
+    twice, and resume an interrupted download with a Range request.
+    '''
+
+    chunk_size = 64 * 1024
+
+    @staticmethod
+    def parse_range(header, size):
+        '''Return the start and end of the single byte range given, or
+        ``None`` if none is given, or it is malformed.
+
+        Raises :py:exc:`ValueError` if the range cannot be satisfied.
+        '''
+        if not header or not header.startswith('bytes=') or ',' in header:
+            return None
+
+        first, sep, last = header[len('bytes='):].strip().partition('-')
+
+        if not sep or not (first or last) or \
+                not (first + last).isdigit():
+            return None
+
+        # a range ending before it starts is malformed rather than
+        # unsatisfiable, and so is ignored
+        if first and last and int(last) < int(first):
+            return None
+
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start, end = int(first), min(int(last or size - 1), size - 1)
+
+        if start > end or start >= size:
+            raise ValueError(header)
+
+        return start, end
+
+    @classmethod
+    def read(cls, fp, length):
+        with fp:
+            while length > 0:
+                chunk = fp.read(min(length, cls.chunk_size))
+
+                if not chunk:
+                    break
+
+                length -= len(chunk)
+
+                yield chunk
+
+    def get(self, request, type, *args, **kwargs):
+        if type not in GetRegistrationsView.all_object_classes:
+            raise Http404
+
+        try:
+            fp = open(snapshot.get_path(type), 'rb')
+        except FileNotFoundError:
+            raise Http404
+
+        # the file may be replaced, but what we opened remains intact
+        stat = os.fstat(fp.fileno())
+        etag = quote_etag('{:x}-{:x}'.format(stat.st_mtime_ns, stat.st_size))
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            fp.close()
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+
+            return response
+
+        try:
+            range_ = self.parse_range(request.META.get('HTTP_RANGE'),
+                                      stat.st_size)
+        except ValueError:
+            fp.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(stat.st_size)
+
+            return response
+
+        if request.META.get('HTTP_IF_RANGE', etag) != etag:
+            range_ = None
+
+        if range_ is None:
+            start, end = 0, stat.st_size - 1
+            status = 200
+        else:
+            start, end = range_
+            status = 206
+
+        fp.seek(start)
+
+        response = StreamingHttpResponse(
+            self.read(fp, end - start + 1),
+            status=status,
+            content_type='application/gzip',
+        )
+
+        if range_ is not None:
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(
+                start, end, stat.st_size,
+            )
+
+        response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Content-Disposition'] = \
+            'attachment; filename="{}.ndjson.gz"'.format(type)
+
+        return response
 
 
 def access_denied_handler(request):
@@ -156,7 +506,53 @@ def access_denied_handler(request):
     return response
 
 
-class DatabaseCheckView(View):
+class DatabaseCheckView(JsonView):
+    '''
+    Report the health of the database for monitoring and load
+    balancers: the round-trip latency of a constant query, the state
+    of the connections and the age of the oldest unreceipted event,
+    which is a lookup on the partial index on unreceipted events.
+    Responds with 503 if the database cannot be queried.
+    '''
+
+    def get(self, request, *args, **kwargs):
+        try:
+            started = time.perf_counter()
+
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+
+            latency = time.perf_counter() - started
+
+            oldest = events.Event.objects.filter(
+                receipt_obtained__isnull=True,
+            ).order_by('created', 'pk').values_list(
+                'created', flat=True,
+            ).first()
+        except DatabaseError as exc:
+            return {
+                'status': 'unavailable',
+                'error': str(exc),
+                'connections': connections.pool_state(),
+            }, 503
+
+        return {
+            'status': 'ok',
+            'latency_ms': round(latency * 1000, 3),
+            'connections': connections.pool_state(),
+            'oldest_unreceipted_age': (
+                (timezone.now() - oldest).total_seconds()
+                if oldest is not None else None
+            ),
+        }
+
+
+class MetricsView(View):
+    '''
+    Expose metrics of the delivery of events for Prometheus.
+    '''
+
     def get(self, request, *args, **kwargs):
-        count = State.objects.count()
-        return HttpResponse()
+        return HttpResponse(metrics.get_metrics(),
+                            content_type=metrics.CONTENT_TYPE)
@@ -10,7 +10,7 @@
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
-# Where to push events
+# Where the push_worker command pushes events
 # PUSH_URL = 'http://localhost:8445/command/dump'
 
 
@@ -22,6 +22,15 @@ DATABASES = {
     },
 }
 
+# Seconds to keep database connections open across requests; 0
+# connects for each request
+# DATABASE_CONN_MAX_AGE = 600
+
+# Record the queries and timings of each request, and log those slower
+# than the given amount of seconds
+# INSTRUMENTATION = True
+# INSTRUMENTATION_SLOW_REQUEST = 1.0
+
 #
 # Set the time zone for the UI.
 #
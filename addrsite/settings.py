@@ -67,6 +67,7 @@ if sys.platform == 'win32':
     ]
 
 MIDDLEWARE = [
+    'addrreg.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -109,6 +110,21 @@ DATABASES = {
     }
 }
 
+# Keep database connections open across requests for this many
+# seconds, or indefinitely if None, and check them before reuse once
+# idle for a while. This avoids connecting and authenticating for each
+# request, which is particularly slow with the SSPI authentication used
+# with SQL Server below. Applies to each database unless it sets
+# CONN_MAX_AGE itself; set it to 0 to connect for each request.
+DATABASE_CONN_MAX_AGE = 600
+
+# Record the SQL queries, time and response size of each request,
+# exposing them by view at /monitor/metrics and logging any request
+# taking longer than INSTRUMENTATION_SLOW_REQUEST seconds. Disabled, it
+# costs nothing.
+INSTRUMENTATION = False
+INSTRUMENTATION_SLOW_REQUEST = 1.0
+
 
 # Admin site reordering
 # https://django-modeladmin-reorder.readthedocs.io/en/latest/readme.html#configuration
@@ -182,6 +198,11 @@ STATICFILES_DIRS = [
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# Where the snapshot command writes its snapshots, and whence they are
+# served
+
+SNAPSHOT_DIR = os.path.join(BASE_DIR, 'snapshots')
+
 if platform.python_implementation() == 'PyPy':
     from psycopg2cffi import compat
     compat.register()
@@ -192,6 +213,10 @@ if os.path.exists(os.path.join(os.path.dirname(__file__),
 else:
     print('No local settings!')
 
+for _database in DATABASES.values():
+    _database.setdefault('CONN_MAX_AGE', DATABASE_CONN_MAX_AGE)
+    _database.setdefault('CONN_HEALTH_CHECKS', True)
+
 
 if sys.platform == 'win32':
     # this horrible hack injects the use of SSPI authentication into
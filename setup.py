@@ -22,7 +22,6 @@ requires = [
     "eventlet~=0.21.0",
     "babel~=2.4.0",
     "requests~=2.21.0",
-    "grequests~=0.3.0",
     "progress",
     "python-dateutil~=2.6.0",
     # Testing requirements